@@ -0,0 +1,220 @@
+import argparse
+import csv
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from component_builder import build_weighted_components
+from grading import score_questions
+from question_groupby import group_by_question
+from scheme import load_or_compile
+from text_extracr import get_breaker, iter_folder, list_images, process_context, requeue
+
+
+# Set once per worker process by _init_worker
+_model_by_q = None
+_model_embs = None
+_total_marks = None
+_assignment = None
+
+
+def _init_worker(model_by_q, model_embs, total_marks, assignment):
+    global _model_by_q, _model_embs, _total_marks, _assignment
+
+    # One worker per core already: torch's intra-op pool (one thread per
+    # core by default) in every worker would oversubscribe the CPU
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+    _model_by_q = model_by_q
+    _model_embs = model_embs
+    _total_marks = total_marks
+    _assignment = assignment
+
+
+def _grade(student, student_answer):
+    """
+    Runs in a worker process: components → grouping → scoring.
+    """
+    student_components = build_weighted_components(student_answer, _total_marks)
+    student_by_q = group_by_question(student_components)
+
+    question_scores, question_breakdowns, total_score = score_questions(
+        _model_by_q,
+        student_by_q,
+        _total_marks,
+        model_embs=_model_embs,
+        assignment=_assignment
+    )
+
+    return {
+        "student": student,
+        "pages": len(student_answer),
+        "total_score": float(round(total_score, 2)),
+        "question_scores": question_scores,
+        "question_breakdowns": question_breakdowns,
+    }
+
+
+def student_folders(students_dir):
+    """
+    Every sub-folder containing images is one student's script.
+    """
+    for name in sorted(os.listdir(students_dir)):
+        path = os.path.join(students_dir, name)
+        if os.path.isdir(path) and list_images(path):
+            yield name, path
+
+
+def extract_student(folder, breaker=None):
+    """
+    Extract one student's pages; pages that exhausted their retries are
+    re-queued once at the end (successful pages are not redone).
+    Returns (pages in order, dead letters still failing).
+    """
+    dead_letters = []
+    pages = {
+        index: data
+        for index, _, data in iter_folder(folder, breaker=breaker, dead_letters=dead_letters)
+        if data
+    }
+
+    if dead_letters:
+        print(f"🔁 Re-queueing {len(dead_letters)} failed pages")
+        pages.update(
+            (index, data)
+            for index, _, data in requeue(dead_letters, breaker=breaker)
+            if data
+        )
+
+    return [pages[i] for i in sorted(pages)], dead_letters
+
+
+def prepare_model(model_folder, total_marks):
+    scheme = load_or_compile(model_folder, total_marks)
+    return scheme["model_by_q"], scheme["model_embs"]
+
+
+def grade_class(model_folder, students_dir, total_marks, out_jsonl,
+                out_csv=None, workers=None, assignment="greedy"):
+    """
+    Grade every student folder in students_dir against one model answer.
+
+    The model answer is compiled (or loaded) as a scheme once. Students are
+    extracted one at a time in this process (network bound) and scoring
+    is spread over a process pool (CPU bound). At most 2 × workers
+    extracted scripts are in flight, so memory stays flat for any class
+    size. Results are streamed to JSONL (and optionally CSV) as they finish.
+    One circuit breaker is shared by the whole class, so an API outage
+    pauses extraction instead of failing every remaining script; pages that
+    still fail are listed in the result's "failed_pages".
+    """
+    model_by_q, model_embs = prepare_model(model_folder, total_marks)
+
+    if not model_by_q:
+        raise ValueError(f"No questions extracted from model answer '{model_folder}'")
+
+    qids = list(model_by_q)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    graded = 0
+    breaker = get_breaker()
+
+    ctx = process_context()
+
+    with open(out_jsonl, "w", encoding="utf-8") as jsonl_file, \
+            ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(model_by_q, model_embs, total_marks, assignment)
+            ) as pool:
+
+        csv_file = open(out_csv, "w", newline="", encoding="utf-8") if out_csv else None
+        writer = None
+        if csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["student", "total_score", *qids])
+
+        def write(result):
+            jsonl_file.write(json.dumps(result) + "\n")
+            jsonl_file.flush()
+            if writer:
+                writer.writerow([
+                    result["student"],
+                    result.get("total_score", ""),
+                    *[result.get("question_scores", {}).get(q, "") for q in qids]
+                ])
+                csv_file.flush()
+
+        def drain(pending, block_until):
+            nonlocal graded
+            while len(pending) > block_until:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    student, failed_pages = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"student": student, "error": str(e)}
+                    if failed_pages:
+                        result["failed_pages"] = failed_pages
+                    write(result)
+                    graded += 1
+                    print(f"✅ Graded {student} ({graded})")
+
+        pending = {}
+
+        try:
+            for student, folder in student_folders(students_dir):
+                print(f"\n===== {student} =====")
+                student_answer, dead_letters = extract_student(folder, breaker)
+                failed_pages = [d["source"] for d in dead_letters]
+
+                if not student_answer:
+                    write({"student": student, "error": "No pages extracted", "failed_pages": failed_pages})
+                    continue
+
+                future = pool.submit(_grade, student, student_answer)
+                pending[future] = (student, failed_pages)
+                drain(pending, max_in_flight)
+
+            drain(pending, 0)
+        finally:
+            if csv_file:
+                csv_file.close()
+
+    return graded
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Grade a whole class against one model answer"
+    )
+    parser.add_argument("model_folder", help="folder with model answer pages")
+    parser.add_argument("students_dir", help="directory with one sub-folder per student")
+    parser.add_argument("--total-marks", type=float, default=20)
+    parser.add_argument("--out", default="results.jsonl", help="JSONL output path")
+    parser.add_argument("--csv", default=None, help="optional CSV summary path")
+    parser.add_argument("--workers", type=int, default=None, help="scoring processes")
+    parser.add_argument("--assignment", choices=["greedy", "optimal"], default="greedy")
+    args = parser.parse_args()
+
+    graded = grade_class(
+        args.model_folder,
+        args.students_dir,
+        args.total_marks,
+        args.out,
+        out_csv=args.csv,
+        workers=args.workers,
+        assignment=args.assignment
+    )
+
+    print(f"\nGraded {graded} scripts → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1347 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_groq import FakeGroq
+
+
+# =====================================================
+# EXTRACTION — sequential vs concurrent process_folder
+# =====================================================
+
+def _make_fake_pages(n_pages):
+    folder = tempfile.mkdtemp(prefix="bench_pages_")
+    for i in range(n_pages):
+        with open(os.path.join(folder, f"page_{i:03d}.jpg"), "wb") as f:
+            f.write(os.urandom(2048))
+    return folder
+
+
+def bench_extraction(args):
+    import llm_client
+    import text_extracr
+
+    folder = _make_fake_pages(args.pages)
+    original_provider = llm_client.set_provider(FakeGroq(latency=args.latency))
+
+    try:
+        for concurrency in (1, args.concurrency):
+            start = time.perf_counter()
+            results = text_extracr.process_folder(
+                folder,
+                concurrency=concurrency,
+                requests_per_minute=None,
+                tokens_per_minute=None,
+                use_cache=False
+            )
+            elapsed = time.perf_counter() - start
+
+            print(
+                f"concurrency={concurrency:<3} pages={len(results):<4} "
+                f"time={elapsed:.2f}s  pages/s={len(results) / elapsed:.2f}"
+            )
+    finally:
+        llm_client.set_provider(original_provider)
+        shutil.rmtree(folder)
+
+
+# =====================================================
+# PREPROCESS — payload size / upload time before vs after shrinking
+# =====================================================
+
+def bench_preprocess(args):
+    import text_extracr
+    from preprocess import PREPROCESS_OPTIONS, preprocess_image
+
+    options = dict(PREPROCESS_OPTIONS, crop_margins=args.crop, deskew=args.deskew)
+    bytes_per_s = args.mbps * 1e6 / 8
+    totals = {"original": 0, "processed": 0, "ms": 0.0, "pages": 0}
+
+    for folder in args.folders:
+        for path in text_extracr.list_images(folder):
+            data = text_extracr.read_image(path)
+
+            start = time.perf_counter()
+            processed = preprocess_image(data, options)
+            ms = (time.perf_counter() - start) * 1000
+
+            totals["original"] += len(data)
+            totals["processed"] += len(processed)
+            totals["ms"] += ms
+            totals["pages"] += 1
+
+            print(
+                f"{path:<40} {len(data) / 1024:8.1f} KB → {len(processed) / 1024:8.1f} KB  "
+                f"({1 - len(processed) / len(data):6.1%} saved)  {ms:6.1f} ms"
+            )
+
+    if not totals["pages"]:
+        print("No pages found")
+        return
+
+    # base64 inflates the request body by 4/3
+    upload_before = totals["original"] * 4 / 3 / bytes_per_s
+    upload_after = totals["processed"] * 4 / 3 / bytes_per_s
+
+    print(
+        f"\npages={totals['pages']}  "
+        f"bytes {totals['original']} → {totals['processed']} "
+        f"({1 - totals['processed'] / totals['original']:.1%} saved)  "
+        f"preprocess {totals['ms'] / totals['pages']:.1f} ms/page"
+    )
+    print(
+        f"estimated upload @ {args.mbps:g} Mbit/s: "
+        f"{upload_before * 1000 / totals['pages']:.1f} → "
+        f"{upload_after * 1000 / totals['pages']:.1f} ms/page"
+    )
+
+    if args.live:
+        # Real API calls (needs GROQ_API_KEY); cache off so both runs hit the network
+        for label, opts in (("raw", None), ("preprocessed", options)):
+            for folder in args.folders:
+                start = time.perf_counter()
+                results = text_extracr.process_folder(folder, use_cache=False, preprocess=opts)
+                elapsed = time.perf_counter() - start
+                print(f"live {label:<13} {folder:<20} pages={len(results):<3} time={elapsed:.2f}s")
+
+
+# =====================================================
+# DEDUPE — perceptual-hash duplicate detection speed / accuracy
+# =====================================================
+
+def _perturbed_copy(data, rng):
+    """
+    Re-photograph-like copy: small rotation, brightness and re-encode.
+    """
+    import io
+    from PIL import Image, ImageEnhance
+
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    img = img.rotate(rng.uniform(-1.5, 1.5), fillcolor=(255, 255, 255))
+    img = ImageEnhance.Brightness(img).enhance(rng.uniform(0.9, 1.1))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=rng.randint(50, 90))
+    return out.getvalue()
+
+
+def _ruled_page(rng, row):
+    """
+    Blank ruled page with one short line of writing on line `row`: such
+    pages are only a few hash bits apart.
+    """
+    import io
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (850, 1100), "white")
+    draw = ImageDraw.Draw(img)
+    for y in range(80, 1100, 40):
+        draw.line([(0, y), (850, y)], fill=(150, 170, 220), width=2)
+
+    y = 80 + 40 * row
+    draw.text((rng.randint(60, 400), y - 22), f"x = {rng.randint(0, 99)} + y^2", fill="black", font_size=28)
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+def bench_dedupe(args):
+    import random
+    import text_extracr
+    from page_dedup import find_duplicates
+
+    rng = random.Random(0)
+    originals = [
+        text_extracr.read_image(path)
+        for folder in args.folders
+        for path in text_extracr.list_images(folder)
+    ]
+    # Near-identical but distinct pages (writing on different lines) must
+    # never collapse
+    originals += [
+        _ruled_page(rng, row)
+        for row in rng.sample(range(1, 21), min(args.ruled_pages, 20))
+    ]
+
+    # Every distinct page once, then exact and perturbed copies of random pages
+    pages = list(originals)
+    expected = {}
+    while len(pages) < args.pages:
+        source = rng.randrange(len(originals))
+        expected[len(pages)] = source
+        copy = originals[source] if rng.random() < 0.5 else _perturbed_copy(originals[source], rng)
+        pages.append(copy)
+
+    start = time.perf_counter()
+    duplicates = find_duplicates(pages, args.max_distance)
+    elapsed = time.perf_counter() - start
+
+    # A missed copy is kept, so later copies may collapse onto it instead
+    def root(i):
+        return expected.get(i, i)
+
+    missed = [i for i in expected if i not in duplicates]
+    false = [i for i in duplicates if i not in expected]
+    wrong = [i for i, (orig, _) in duplicates.items() if i in expected and root(orig) != expected[i]]
+
+    print(
+        f"pages={len(pages)}  time={elapsed:.3f}s  "
+        f"({elapsed / len(pages) * 1000:.2f} ms/page)"
+    )
+    print(
+        f"duplicates planted={len(expected)}  found={len(duplicates)}  "
+        f"missed={len(missed)}  false={len(false)}  wrong_original={len(wrong)}"
+    )
+
+    if false or wrong:
+        print("❌ Distinct pages were collapsed")
+        sys.exit(1)
+
+
+# =====================================================
+# EMBEDDING — per-string encode vs batched embed()
+# =====================================================
+
+def _synthetic_texts(n):
+    return [
+        f"Component {i}: the student explains concept {i % 37} "
+        f"with supporting detail about topic {i % 11} and example {i}."
+        for i in range(n)
+    ]
+
+
+def bench_embedding(args):
+    import embedder
+    from embedding_store import EmbeddingStore
+
+    store_dir = tempfile.mkdtemp(prefix="bench_store_")
+
+    for n in args.sizes:
+        texts = _synthetic_texts(n)
+
+        start = time.perf_counter()
+        for t in texts:
+            embedder.get_model().encode(t)
+        per_string = time.perf_counter() - start
+
+        # Fresh, empty store so every text is a miss
+        backend = embedder._resolve_backend(None)
+        embedder._stores[backend] = EmbeddingStore(
+            embedder.MODEL_NAME, embedder.get_store().dim,
+            cache_dir=os.path.join(store_dir, str(n))
+        )
+        start = time.perf_counter()
+        embedder.embed(texts, batch_size=args.batch_size)
+        batched = time.perf_counter() - start
+
+        print(
+            f"components={n:<5} per-string={per_string:.3f}s  "
+            f"batched={batched:.3f}s  speedup={per_string / batched:.1f}x"
+        )
+
+    shutil.rmtree(store_dir)
+
+
+# =====================================================
+# BACKENDS — accuracy vs fp32 and texts/second
+# =====================================================
+
+# (model component, student component) pairs covering close paraphrases,
+# partial answers and unrelated content
+ACCURACY_PAIRS = [
+    ("Photosynthesis converts light energy into chemical energy.",
+     "Plants turn sunlight into chemical energy through photosynthesis."),
+    ("Mitochondria are the powerhouse of the cell and produce ATP.",
+     "The mitochondria makes ATP for the cell."),
+    ("Newton's second law states that force equals mass times acceleration.",
+     "F = ma, force is mass multiplied by acceleration."),
+    ("A binary search halves the search interval at every step.",
+     "Binary search repeatedly divides the sorted list in two."),
+    ("Supply and demand determine the market price.",
+     "The French revolution began in 1789."),
+    ("Osmosis is the movement of water across a semi-permeable membrane.",
+     "Water diffuses through a membrane from low to high solute concentration."),
+    ("The TCP handshake uses SYN, SYN-ACK and ACK packets.",
+     "Photosynthesis happens in chloroplasts."),
+    ("Inflation is a general rise in the price level over time.",
+     "Prices generally go up over time, which is called inflation."),
+]
+
+
+def _pair_similarities(model):
+    left = model.encode([a for a, _ in ACCURACY_PAIRS], normalize_embeddings=True,
+                        convert_to_numpy=True, show_progress_bar=False)
+    right = model.encode([b for _, b in ACCURACY_PAIRS], normalize_embeddings=True,
+                         convert_to_numpy=True, show_progress_bar=False)
+    return (left * right).sum(axis=1)
+
+
+def bench_backends(args):
+    import embedder
+
+    texts = _synthetic_texts(args.texts)
+    reference = _pair_similarities(embedder.get_model("torch"))
+    failed = False
+
+    for backend in args.backends:
+        try:
+            model = embedder.get_model(backend)
+        except Exception as e:
+            print(f"backend={backend:<6} skipped: {e}")
+            continue
+
+        model.encode(texts[:8], show_progress_bar=False)
+        start = time.perf_counter()
+        model.encode(texts, batch_size=args.batch_size, show_progress_bar=False)
+        elapsed = time.perf_counter() - start
+
+        max_diff = float(abs(_pair_similarities(model) - reference).max())
+        ok = max_diff <= args.tolerance
+        failed = failed or not ok
+
+        print(
+            f"backend={backend:<6} texts/s={len(texts) / elapsed:8.1f}  "
+            f"max |Δcos| vs fp32={max_diff:.4f}  {'✅' if ok else '❌'}"
+        )
+
+    if failed:
+        sys.exit(1)
+
+
+# =====================================================
+# MATCHING — vectorised greedy vs original Python loop
+# =====================================================
+
+def _reference_greedy(sims, threshold):
+    # Original per-row scan from matcher.score_student_answer
+    used_students = set()
+    result = []
+
+    for i in range(sims.shape[0]):
+        best_j = -1
+        best_sim = 0.0
+
+        for j, sim in enumerate(sims[i]):
+            if j not in used_students and sim > best_sim:
+                best_sim = float(sim)
+                best_j = j
+
+        if best_sim >= threshold and best_j != -1:
+            used_students.add(best_j)
+        else:
+            best_j = -1
+
+        result.append((best_j, best_sim))
+
+    return result
+
+
+def _random_sims(m, n, seed):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    a = rng.standard_normal((m, 32)).astype(np.float32)
+    b = rng.standard_normal((n, 32)).astype(np.float32)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    # Quantise so ties actually occur
+    return np.round(a @ b.T, 2)
+
+
+def _reference_score(model_components, student_components, model_embs, student_embs,
+                     total_marks, threshold=0.10, max_penalty=2.0):
+    # Original matcher.score_student_answer (cosine per row, greedy loop).
+    # Cosine computed the way sklearn's cosine_similarity does (normalise,
+    # then dot, in the input dtype), without depending on sklearn
+    import numpy as np
+
+    def unit(rows):
+        rows = np.asarray(rows)
+        return rows / np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+
+    model_unit = unit(model_embs)
+    student_unit = unit(student_embs)
+
+    breakdown = []
+    total_score = 0.0
+    used_students = set()
+    matched_student_weight = 0.0
+
+    for i, m in enumerate(model_components):
+        sims = student_unit @ model_unit[i]
+
+        best_j = -1
+        best_sim = 0.0
+
+        for j, sim in enumerate(sims):
+            if j not in used_students and sim > best_sim:
+                best_sim = float(sim)
+                best_j = j
+
+        earned = 0.0
+        if best_sim >= threshold and best_j != -1:
+            earned = float(best_sim * m["weight"])
+            used_students.add(best_j)
+            matched_student_weight += student_components[best_j]["weight"]
+
+        total_score += earned
+
+        breakdown.append({
+            "component": m["id"],
+            "topic": m["topic"],
+            "weight": float(round(m["weight"], 2)),
+            "similarity": float(round(best_sim, 2)),
+            "score": float(round(earned, 2))
+        })
+
+    total_student_weight = sum(c["weight"] for c in student_components)
+    unmatched_weight = total_student_weight - matched_student_weight
+
+    penalty = 0.0
+    if total_student_weight > 0:
+        penalty = float((unmatched_weight / total_student_weight) * max_penalty)
+
+    final_score = max(0.0, min(float(total_marks), float(total_score - penalty)))
+
+    breakdown.append({
+        "penalty_reason": "Irrelevant or extra content",
+        "penalty": float(round(penalty, 2))
+    })
+
+    return float(round(final_score, 2)), breakdown
+
+
+def _random_answer(m, n, seed):
+    """
+    Model / student components with embeddings; student components are
+    noisy copies of model ones plus unrelated extras, in shuffled order.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+
+    def normalise(x):
+        return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+    model_embs = normalise(rng.standard_normal((m, 32)))
+    copies = rng.integers(0, m, n)
+    related = rng.random(n) < 0.7
+    student_embs = normalise(np.where(
+        related[:, None],
+        model_embs[copies] + rng.normal(0, 0.8, (n, 32)),
+        rng.standard_normal((n, 32))
+    ))
+
+    def components(prefix, count):
+        weights = rng.uniform(0.2, 2.0, count)
+        return [
+            {"id": f"{prefix}{i}", "topic": f"topic {i}", "text": f"{prefix} text {i}", "weight": float(w)}
+            for i, w in enumerate(weights)
+        ]
+
+    return components("m", m), components("s", n), model_embs, student_embs
+
+
+def bench_matching(args):
+    import numpy as np
+
+    import matcher
+    from matcher import greedy_assignment
+
+    threshold = 0.10
+
+    for size in args.sizes:
+        sims = _random_sims(size, size, seed=size)
+
+        start = time.perf_counter()
+        expected = _reference_greedy(sims, threshold)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        assigned, best_sims = greedy_assignment(sims, threshold)
+        vec_time = time.perf_counter() - start
+
+        actual = [(int(j), float(s)) for j, s in zip(assigned, best_sims)]
+        if actual != expected:
+            print(f"❌ components={size}: vectorised assignment differs from reference")
+            sys.exit(1)
+
+        # Full (score, breakdown) against the original scorer
+        model, student, model_embs, student_embs = _random_answer(size, size, seed=size)
+        total_marks = float(size)
+
+        start = time.perf_counter()
+        expected = _reference_score(model, student, model_embs, student_embs, total_marks, threshold)
+        ref_time = time.perf_counter() - start
+
+        # Student embeddings come from the fixture, not the embedding model
+        original_embed = matcher.embed
+        matcher.embed = lambda texts: student_embs
+        try:
+            start = time.perf_counter()
+            actual = matcher.score_student_answer(
+                model, student, total_marks, threshold, model_embs=np.asarray(model_embs)
+            )
+            score_time = time.perf_counter() - start
+        finally:
+            matcher.embed = original_embed
+
+        if actual != expected:
+            print(f"❌ components={size}: score / breakdown differ from the original scorer")
+            sys.exit(1)
+
+        print(
+            f"components={size:<5} loop={loop_time * 1000:8.1f}ms  "
+            f"vectorised={vec_time * 1000:7.1f}ms  speedup={loop_time / vec_time:.1f}x  "
+            f"score_student_answer={score_time * 1000:7.1f}ms (original {ref_time * 1000:7.1f}ms)  "
+            f"✅ identical"
+        )
+
+
+def bench_assignment(args):
+    import numpy as np
+    from matcher import greedy_assignment, optimal_assignment
+
+    threshold = 0.10
+
+    for size in args.sizes:
+        sims = _random_sims(size, size, seed=size)
+        weights = np.random.default_rng(size).uniform(0.2, 2.0, size)
+
+        def total(assigned):
+            rows = np.flatnonzero(assigned != -1)
+            return float((sims[rows, assigned[rows]] * weights[rows]).sum())
+
+        start = time.perf_counter()
+        greedy, _ = greedy_assignment(sims, threshold)
+        greedy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        optimal, _ = optimal_assignment(sims, weights, threshold, args.top_k)
+        optimal_time = time.perf_counter() - start
+
+        print(
+            f"components={size:<5} greedy={greedy_time * 1000:8.1f}ms score={total(greedy):9.2f}  "
+            f"optimal(k={args.top_k})={optimal_time * 1000:8.1f}ms score={total(optimal):9.2f}"
+        )
+
+
+# =====================================================
+# IMPORTS — startup budget for the grading modules
+# =====================================================
+
+GRADING_MODULES = [
+    "text_extracr",
+    "component_builder",
+    "question_groupby",
+    "embedder",
+    "matcher",
+    "objective2_llm",
+    "objective_2",
+    "job_queue",
+    "worker",
+]
+
+HEAVY_MODULES = ["torch", "sentence_transformers", "groq"]
+
+
+def bench_imports(args):
+    """
+    Import the grading modules in a fresh interpreter and fail if that
+    takes longer than the budget or drags in torch / groq eagerly.
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"for name in {GRADING_MODULES!r}: __import__(name)\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout.splitlines()
+
+    elapsed = float(out[0])
+    loaded = [m for m in out[1].split(",") if m] if len(out) > 1 else []
+
+    print(f"import time={elapsed:.3f}s  budget={args.budget:.3f}s")
+
+    failed = False
+    if loaded:
+        print(f"❌ Eagerly imported: {', '.join(loaded)}")
+        failed = True
+    if elapsed > args.budget:
+        print("❌ Import time over budget")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print("✅ Import budget OK")
+
+
+# =====================================================
+# MODERATION — whole-answer sequential vs question-scoped concurrent
+# =====================================================
+
+def bench_moderation(args):
+    import llm_client
+    from objective_2 import estimate_tokens, flatten_text, moderate_questions, question_texts
+    from objective2_llm import compare_ai_with_human
+
+    model = [synthetic_paper(args.questions, args.parts, args.depth, args.width, seed=1)]
+    student = [synthetic_paper(args.questions, args.parts, args.depth, args.width, seed=2)]
+    qids = [q["question_id"] for q in model[0]["questions"]]
+
+    def request(model_text, student_text):
+        return dict(
+            model_text=model_text, student_text=student_text, ai_score=5,
+            ai_breakdown=[], human_score=5, human_feedback={}, use_cache=False
+        )
+
+    original_provider = llm_client.set_provider(FakeGroq(latency=args.latency))
+    try:
+        # Before: full flattened answers, one question at a time
+        model_text, student_text = flatten_text(model), flatten_text(student)
+        start = time.perf_counter()
+        for _ in qids:
+            compare_ai_with_human(**request(model_text, student_text))
+        before_s = time.perf_counter() - start
+        before_tokens = len(qids) * (estimate_tokens(model_text) + estimate_tokens(student_text))
+
+        # After: per-question budgeted slices, all questions at once
+        model_texts = question_texts(model, args.max_tokens)
+        student_texts = question_texts(student, args.max_tokens)
+        requests = {
+            qid: request(model_texts.get(qid, ""), student_texts.get(qid, ""))
+            for qid in qids
+        }
+        start = time.perf_counter()
+        moderate_questions(requests, args.concurrency)
+        after_s = time.perf_counter() - start
+        after_tokens = sum(
+            estimate_tokens(r["model_text"]) + estimate_tokens(r["student_text"])
+            for r in requests.values()
+        )
+    finally:
+        llm_client.set_provider(original_provider)
+
+    print(f"questions={len(qids)}  answer text tokens (est.) {before_tokens} → {after_tokens}")
+    print(f"wall time {before_s:.2f}s → {after_s:.2f}s  (x{before_s / after_s:.1f})")
+
+
+# =====================================================
+# TRANSPORT — pooled sync / async calls against a local stand-in server
+# =====================================================
+
+def bench_transport(args):
+    import asyncio
+
+    import fake_groq
+    import llm_client
+
+    server, base_url = fake_groq.serve(FakeGroq(latency=args.latency))
+    request = dict(model="bench", messages=[{"role": "user", "content": "ping"}])
+
+    def fresh_call():
+        # Baseline: a new client (and TCP connection) per call
+        provider = llm_client.GroqProvider(api_key="bench", base_url=base_url)
+        try:
+            return provider.create(**request)
+        finally:
+            provider.close()
+
+    pooled = llm_client.GroqProvider(
+        api_key="bench", base_url=base_url, max_connections=args.concurrency
+    )
+
+    async def run_async():
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one():
+            async with semaphore:
+                return await pooled.acreate(**request)
+
+        return await asyncio.gather(*[one() for _ in range(args.calls)])
+
+    try:
+        for label, run in [
+            ("new client per call", lambda: _threaded(fresh_call, args)),
+            ("pooled sync (threads)", lambda: _threaded(lambda: pooled.create(**request), args)),
+            ("pooled async", lambda: asyncio.run(run_async())),
+        ]:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print(f"{label:<24} calls={args.calls}  time={elapsed:.2f}s  calls/s={args.calls / elapsed:.1f}")
+    finally:
+        pooled.close()
+        server.shutdown()
+
+
+def _threaded(call, args):
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(lambda _: call(), range(args.calls)))
+
+
+# =====================================================
+# BATCHING — one request per page vs several pages per request
+# =====================================================
+
+def bench_batching(args):
+    import llm_client
+    import text_extracr
+    from fake_groq import DEFAULT_EXTRACTION, count_images
+
+    folder = _make_fake_pages(args.pages)
+
+    def respond(kwargs):
+        # One "Q1" per image, as a model splitting an answer at page breaks would
+        question = DEFAULT_EXTRACTION["questions"][0]
+        return {"questions": [question] * count_images(kwargs)}
+
+    try:
+        for batch in args.batch_sizes:
+            fake = FakeGroq(
+                latency=args.latency, latency_per_image=args.latency_per_image,
+                response=respond
+            )
+            original_provider = llm_client.set_provider(fake)
+            try:
+                start = time.perf_counter()
+                results = text_extracr.process_folder(
+                    folder, concurrency=args.concurrency,
+                    requests_per_minute=None, tokens_per_minute=None,
+                    use_cache=False, preprocess=None, dedupe=False,
+                    batch_pages=batch
+                )
+                elapsed = time.perf_counter() - start
+            finally:
+                llm_client.set_provider(original_provider)
+
+            prompt_tokens = len(text_extracr.batch_prompt(batch)) // 4 * fake.calls
+            questions = sum(len(r["questions"]) for r in results)
+            print(
+                f"batch={batch:<2} requests={fake.calls:<4} time={elapsed:6.2f}s  "
+                f"pages/s={args.pages / elapsed:6.2f}  "
+                f"prompt tokens/page={prompt_tokens / args.pages:7.1f}  "
+                f"questions={questions}"
+            )
+    finally:
+        shutil.rmtree(folder)
+
+
+# =====================================================
+# RETRY — fixed-delay retries vs backoff + Retry-After + circuit breaker
+# =====================================================
+
+class _FixedRetry:
+    """
+    The old behaviour: max_attempts tries, a constant sleep between them.
+    """
+
+    def __init__(self, max_attempts=3, delay=2.0):
+        self.max_attempts = max_attempts
+        self.fixed = delay
+        self.max_delay = delay
+
+    def delay(self, attempt, exc=None):
+        return self.fixed
+
+    def should_retry(self, attempt, exc, elapsed, delay):
+        return attempt < self.max_attempts
+
+
+class _NoBreaker:
+
+    def wait(self):
+        pass
+
+    def pause(self, seconds):
+        pass
+
+    def record_success(self):
+        pass
+
+    def record_failure(self):
+        pass
+
+
+def bench_retry(args):
+    import llm_client
+    import text_extracr
+    from retry_policy import CircuitBreaker, RetryPolicy
+
+    folder = _make_fake_pages(args.pages)
+    scenarios = {
+        "outage": dict(outage=args.outage),
+        "rate_limited": dict(rate_limit=args.rate_limit),
+    }
+    policies = {
+        "fixed": lambda: (_FixedRetry(), _NoBreaker()),
+        "adaptive": lambda: (
+            RetryPolicy(base_delay=0.5, max_delay=args.max_delay, max_elapsed=args.max_elapsed, seed=0),
+            CircuitBreaker(failure_threshold=5, reset_timeout=args.reset_timeout)
+        ),
+    }
+
+    try:
+        for scenario, fake_kwargs in scenarios.items():
+            for label, make in policies.items():
+                fake = FakeGroq(latency=args.latency, **fake_kwargs)
+                original_provider = llm_client.set_provider(fake)
+                policy, breaker = make()
+                dead_letters = []
+                finished = []
+
+                try:
+                    start = time.perf_counter()
+                    for _ in text_extracr.iter_folder(
+                        folder, concurrency=args.concurrency,
+                        requests_per_minute=None, tokens_per_minute=None,
+                        use_cache=False, preprocess=None, dedupe=False,
+                        policy=policy, breaker=breaker, dead_letters=dead_letters
+                    ):
+                        finished.append(time.perf_counter() - start)
+
+                    first_pass_failed = len(dead_letters)
+                    recovered = sum(
+                        1 for _, _, data in text_extracr.requeue(
+                            dead_letters, concurrency=args.concurrency,
+                            requests_per_minute=None, tokens_per_minute=None,
+                            use_cache=False, preprocess=None,
+                            policy=policy, breaker=breaker
+                        ) if data
+                    )
+                    elapsed = time.perf_counter() - start
+                finally:
+                    llm_client.set_provider(original_provider)
+
+                finished.sort()
+                p95 = finished[min(len(finished) - 1, int(len(finished) * 0.95))]
+                print(
+                    f"{scenario:<13} {label:<9} time={elapsed:6.2f}s  p95 page={p95:6.2f}s  "
+                    f"api calls={fake.calls:<4} 429s={fake.rate_limited:<4} failed={first_pass_failed:<3} "
+                    f"recovered by requeue={recovered:<3} still failed={len(dead_letters)}"
+                )
+    finally:
+        shutil.rmtree(folder)
+
+
+# =====================================================
+# SUITE — offline per-stage throughput / latency, stored as JSON
+# =====================================================
+
+WORDS = (
+    "energy cell membrane force mass acceleration market price inflation "
+    "protein enzyme reaction catalyst algorithm complexity graph node edge "
+    "voltage current resistance circuit theory evidence argument structure"
+).split()
+
+
+def _sentence(rng, n_words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+
+
+def synthetic_topic(rng, depth, width):
+    """
+    Topic node with `width` children per level down to `depth` levels.
+    """
+    return {
+        "topic": _sentence(rng, 3),
+        "content": _sentence(rng),
+        "sub_topics": [
+            synthetic_topic(rng, depth - 1, width) for _ in range(width)
+        ] if depth > 0 else []
+    }
+
+
+def synthetic_paper(questions=3, parts=2, depth=2, width=2, seed=0):
+    """
+    Extraction-shaped answer sheet for component_builder benchmarks.
+    """
+    import random
+
+    rng = random.Random(seed)
+    return {
+        "questions": [
+            {
+                "question_id": f"Q{q}",
+                "question_title": _sentence(rng, 4),
+                "parts": [
+                    dict(synthetic_topic(rng, depth, width), part_id=chr(ord("a") + p))
+                    for p in range(parts)
+                ]
+            }
+            for q in range(1, questions + 1)
+        ]
+    }
+
+
+# =====================================================
+# COMPONENTS — bottom-up flattening vs original per-node subtree walk
+# =====================================================
+
+def _reference_flatten(topic, parent_id, weight, components, main_ratio=0.3):
+    # Original component_builder: collect_full_text re-walks every subtree
+    def collect_full_text(node):
+        texts = []
+
+        def recurse(n):
+            texts.append(f"{n.get('topic', '')}. {n.get('content', '')}".strip())
+            for sub in n.get("sub_topics", []):
+                recurse(sub)
+
+        recurse(node)
+        return " ".join(texts)
+
+    subs = topic.get("sub_topics", [])
+    full_text = collect_full_text(topic)
+
+    if not subs:
+        components.append({"id": parent_id, "text": full_text, "weight": float(weight)})
+        return
+
+    components.append({"id": parent_id, "text": full_text, "weight": float(weight * main_ratio)})
+    sub_weight = weight * (1 - main_ratio) / len(subs)
+    for i, s in enumerate(subs, 1):
+        _reference_flatten(s, f"{parent_id}.S{i}", sub_weight, components, main_ratio)
+
+
+def bench_components(args):
+    import random
+
+    from component_builder import flatten_topic
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), args.nodes * 4 + 1000))
+    rng = random.Random(0)
+
+    def chain(n):
+        root = node = {"topic": _sentence(rng, 3), "content": _sentence(rng), "sub_topics": []}
+        for _ in range(n - 1):
+            child = {"topic": _sentence(rng, 3), "content": _sentence(rng), "sub_topics": []}
+            node["sub_topics"].append(child)
+            node = child
+        return root
+
+    shapes = {
+        "deep": chain(args.nodes),
+        "wide": synthetic_topic(rng, 1, args.nodes - 1),
+        "balanced": synthetic_topic(rng, 4, max(2, round((args.nodes) ** 0.25))),
+    }
+
+    for shape, tree in shapes.items():
+        start = time.perf_counter()
+        expected = []
+        _reference_flatten(tree, "Q1.P1", 10.0, expected)
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = []
+        flatten_topic(tree, "Q1.P1", 10.0, actual, "Q1", "main")
+        new_time = time.perf_counter() - start
+
+        same = [(c["id"], c["text"], c["weight"]) for c in actual] == \
+            [(c["id"], c["text"], c["weight"]) for c in expected]
+        if not same:
+            print(f"❌ {shape}: output differs from the original implementation")
+            sys.exit(1)
+
+        print(
+            f"{shape:<9} nodes={len(actual):<6} original={reference_time * 1000:9.1f}ms  "
+            f"bottom-up={new_time * 1000:8.1f}ms  speedup={reference_time / new_time:6.1f}x  ✅ identical"
+        )
+
+
+# =====================================================
+# UI — full-page rerun vs fragment rerun per interaction
+# =====================================================
+
+def bench_ui(args):
+    """
+    Drive streamlit_app.py headlessly with an N-question exam and time
+    moderation interactions. Before fragments, every keystroke re-ran the
+    whole page (ui.page_rerun); now it re-runs one question's fragment
+    (ui.fragment.moderation). AppTest itself always re-runs the full
+    script, so both spans are recorded for each interaction.
+
+    Grading the sample folders with fake answers would fill the extraction,
+    scheme and embedding caches with them, so the benchmark re-runs itself
+    against a throwaway MARKMASTER_CACHE_DIR. The grading job is executed
+    in that process (against the fake client) instead of by worker.py.
+    """
+    if os.getenv("MARKMASTER_BENCH_ISOLATED") != "1":
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, MARKMASTER_CACHE_DIR=tmp, MARKMASTER_BENCH_ISOLATED="1")
+            subprocess.run(
+                [
+                    sys.executable, os.path.abspath(__file__), "ui",
+                    "--questions", str(args.questions),
+                    "--interactions", str(args.interactions),
+                ],
+                env=env, check=True
+            )
+        return
+
+    import job_queue
+    import llm_client
+    import metrics
+    import worker
+    from streamlit.testing.v1 import AppTest
+
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+    llm_client.set_provider(FakeGroq(
+        latency=0.0, response=synthetic_paper(args.questions, 2, 1, 3)
+    ))
+
+    queue = job_queue.JobQueue()
+    # Looks like a live worker → the app does not start worker.py
+    queue.heartbeat(worker_id="benchmark")
+
+    at = AppTest.from_file(app, default_timeout=120)
+    at.run()
+    at.button[0].click().run()
+
+    worker.run_job(queue, queue.claim("benchmark"))
+    at.run()
+
+    # The app records into its session's registry, not the process-wide one
+    registry = at.session_state["session_metrics"]
+    registry.reset()
+    for i in range(args.interactions):
+        at.text_area[i % len(at.text_area)].input(f"feedback {i}").run()
+
+    spans = metrics.snapshot(registry)["spans"]
+
+    page = spans["ui.page_rerun"]
+    fragment = spans["ui.fragment.moderation"]
+    print(f"questions={args.questions}  interactions={args.interactions}")
+    print(f"before (full page rerun)      mean={page['mean_s'] * 1000:8.1f}ms  max={page['max_s'] * 1000:8.1f}ms")
+    print(f"after  (one question fragment) mean={fragment['mean_s'] * 1000:8.1f}ms  max={fragment['max_s'] * 1000:8.1f}ms")
+
+
+class StageTimer:
+    """
+    Collects per-call latencies and item counts for one pipeline stage.
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self.items = 0
+        self.wall = 0.0
+
+    def call(self, fn, *args, items=1, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.latencies.append(time.perf_counter() - start)
+        self.items += items
+        return result
+
+    def summary(self):
+        import numpy as np
+
+        lat = np.array(self.latencies or [0.0]) * 1000
+        wall = self.wall or float(lat.sum() / 1000)
+        return {
+            "calls": len(self.latencies),
+            "items": self.items,
+            "wall_s": round(wall, 4),
+            "items_per_s": round(self.items / wall, 2) if wall else None,
+            "p50_ms": round(float(np.percentile(lat, 50)), 3),
+            "p90_ms": round(float(np.percentile(lat, 90)), 3),
+            "p99_ms": round(float(np.percentile(lat, 99)), 3),
+        }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_suite(args):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import embedder
+    import llm_client
+    import text_extracr
+    from component_builder import build_weighted_components
+    from embedding_store import EmbeddingStore
+    from matcher import score_student_answer
+    from objective2_llm import compare_ai_with_human
+    from question_groupby import group_by_question
+
+    canned = synthetic_paper(args.questions, args.parts, args.depth, args.width, seed=1)
+    fake = FakeGroq(
+        latency=args.latency, jitter=args.jitter,
+        failure_rate=args.failure_rate, response=canned
+    )
+    original_provider = llm_client.set_provider(fake)
+
+    stages = {}
+    folder = _make_fake_pages(args.pages)
+    store_dir = tempfile.mkdtemp(prefix="bench_store_")
+
+    try:
+        # ---------- EXTRACTION ----------
+        timer = StageTimer()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            pages = list(pool.map(
+                lambda f: timer.call(
+                    text_extracr.extract_content_from_image, f,
+                    retry_delay=0.05, use_cache=False
+                ),
+                text_extracr.list_images(folder)
+            ))
+        timer.wall = time.perf_counter() - start
+        stages["extraction"] = timer.summary()
+
+        # ---------- COMPONENT BUILDING ----------
+        papers = [
+            synthetic_paper(args.questions, args.parts, args.depth, args.width, seed=i)
+            for i in range(args.scripts)
+        ]
+        model_paper = synthetic_paper(args.questions, args.parts, args.depth, args.width, seed=-1)
+
+        timer = StageTimer()
+        student_components = []
+        for paper in papers:
+            components = timer.call(build_weighted_components, [paper], 20, items=0)
+            timer.items += len(components)
+            student_components.append(components)
+        model_components = build_weighted_components([model_paper], 20)
+        stages["component_building"] = timer.summary()
+
+        # ---------- EMBEDDING ----------
+        backend = embedder._resolve_backend(None)
+        embedder._stores[backend] = EmbeddingStore(
+            embedder.MODEL_NAME, embedder.get_store().dim, cache_dir=store_dir
+        )
+
+        timer = StageTimer()
+        for components in [model_components] + student_components:
+            texts = [c["text"] for c in components]
+            timer.call(embedder.embed, texts, items=len(texts))
+        stages["embedding"] = timer.summary()
+
+        # ---------- MATCHING ----------
+        model_by_q = group_by_question(model_components)
+        timer = StageTimer()
+        for components in student_components:
+            student_by_q = group_by_question(components)
+            for qid, q_model in model_by_q.items():
+                timer.call(
+                    score_student_answer, q_model, student_by_q.get(qid, []),
+                    total_marks=20 / len(model_by_q), items=len(q_model)
+                )
+        stages["matching"] = timer.summary()
+
+        # ---------- MODERATION ----------
+        timer = StageTimer()
+        for qid in list(model_by_q)[:args.moderation_calls]:
+            timer.call(
+                compare_ai_with_human,
+                model_text="model", student_text="student", ai_score=5,
+                ai_breakdown=[], human_score=5, human_feedback={}, use_cache=False
+            )
+        stages["moderation"] = timer.summary()
+
+    finally:
+        llm_client.set_provider(original_provider)
+        shutil.rmtree(folder)
+        shutil.rmtree(store_dir)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k != "func"},
+        "extracted_pages": sum(1 for p in pages if p),
+        "fake_api_calls": fake.calls,
+        "stages": stages,
+    }
+
+    for name, stats in stages.items():
+        print(
+            f"{name:<20} items/s={stats['items_per_s']!s:>10}  p50={stats['p50_ms']:9.3f}ms  "
+            f"p90={stats['p90_ms']:9.3f}ms  p99={stats['p99_ms']:9.3f}ms"
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults → {args.out}")
+
+
+def bench_compare(args):
+    """
+    Compare two suite reports stage by stage (new / old).
+    """
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"old={old.get('commit')}  new={new.get('commit')}")
+    regressed = False
+
+    for stage, stats in new["stages"].items():
+        before = old["stages"].get(stage)
+        if not before or not before.get("items_per_s") or not stats.get("items_per_s"):
+            print(f"{stage:<20} (no baseline)")
+            continue
+
+        ratio = stats["items_per_s"] / before["items_per_s"]
+        flag = ""
+        if ratio < 1 - args.tolerance:
+            flag = "❌ regression"
+            regressed = True
+
+        print(
+            f"{stage:<20} throughput x{ratio:5.2f}  "
+            f"p90 {before['p90_ms']:.3f} → {stats['p90_ms']:.3f} ms  {flag}"
+        )
+
+    if regressed:
+        sys.exit(1)
+
+
+def main():
+    from page_dedup import NEAR_DUPLICATE_DISTANCE
+
+    parser = argparse.ArgumentParser(description="MarkMaster benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("extraction", help="process_folder pages/second")
+    p.add_argument("--pages", type=int, default=40)
+    p.add_argument("--latency", type=float, default=0.5)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.set_defaults(func=bench_extraction)
+
+    p = sub.add_parser("preprocess", help="page payload bytes before / after pre-processing")
+    p.add_argument("--folders", nargs="+", default=["model_answer", "student_answer"])
+    p.add_argument("--mbps", type=float, default=10.0, help="uplink bandwidth for the estimate")
+    p.add_argument("--crop", action="store_true", help="also crop blank margins")
+    p.add_argument("--deskew", action="store_true", help="also straighten rotated pages")
+    p.add_argument("--live", action="store_true", help="time real extraction calls raw vs pre-processed")
+    p.set_defaults(func=bench_preprocess)
+
+    p = sub.add_parser("dedupe", help="duplicate page detection speed / accuracy")
+    p.add_argument("--folders", nargs="+", default=["model_answer", "student_answer"])
+    p.add_argument("--pages", type=int, default=300)
+    p.add_argument("--ruled-pages", type=int, default=20)
+    p.add_argument("--max-distance", type=int, default=NEAR_DUPLICATE_DISTANCE,
+                   help="hash distance for near duplicates (the pipeline default is exact copies only)")
+    p.set_defaults(func=bench_dedupe)
+
+    p = sub.add_parser("embedding", help="per-string vs batched embedding")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    p.add_argument("--batch-size", type=int, default=64)
+    p.set_defaults(func=bench_embedding)
+
+    p = sub.add_parser("backends", help="embedding backend accuracy and throughput")
+    p.add_argument("--backends", nargs="+", default=["torch", "onnx", "int8"])
+    p.add_argument("--texts", type=int, default=1000)
+    p.add_argument("--batch-size", type=int, default=64)
+    p.add_argument("--tolerance", type=float, default=0.02)
+    p.set_defaults(func=bench_backends)
+
+    p = sub.add_parser("matching", help="greedy assignment regression + timing")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 300, 1000])
+    p.set_defaults(func=bench_matching)
+
+    p = sub.add_parser("assignment", help="greedy vs optimal assignment")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 300, 1000])
+    p.add_argument("--top-k", type=int, default=5)
+    p.set_defaults(func=bench_assignment)
+
+    p = sub.add_parser("components", help="component flattening on deep / wide trees")
+    p.add_argument("--nodes", type=int, default=3000)
+    p.set_defaults(func=bench_components)
+
+    p = sub.add_parser("ui", help="Streamlit per-interaction latency, page vs fragment")
+    p.add_argument("--questions", type=int, default=15)
+    p.add_argument("--interactions", type=int, default=10)
+    p.set_defaults(func=bench_ui)
+
+    p = sub.add_parser("moderation", help="whole-answer vs question-scoped moderation prompts")
+    p.add_argument("--questions", type=int, default=6)
+    p.add_argument("--parts", type=int, default=2)
+    p.add_argument("--depth", type=int, default=2)
+    p.add_argument("--width", type=int, default=3)
+    p.add_argument("--latency", type=float, default=0.3)
+    p.add_argument("--max-tokens", type=int, default=1500)
+    p.add_argument("--concurrency", type=int, default=4)
+    p.set_defaults(func=bench_moderation)
+
+    p = sub.add_parser("transport", help="LLM transport: per-call clients vs pooled sync / async")
+    p.add_argument("--calls", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--latency", type=float, default=0.05)
+    p.set_defaults(func=bench_transport)
+
+    p = sub.add_parser("batching", help="per-page vs multi-page extraction requests")
+    p.add_argument("--pages", type=int, default=48)
+    p.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--latency", type=float, default=0.8, help="fixed cost per request")
+    p.add_argument("--latency-per-image", type=float, default=0.15)
+    p.set_defaults(func=bench_batching)
+
+    p = sub.add_parser("retry", help="fixed retries vs backoff / Retry-After / circuit breaker")
+    p.add_argument("--pages", type=int, default=40)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--latency", type=float, default=0.1)
+    p.add_argument("--outage", type=float, default=6.0, help="seconds the fake API is down")
+    p.add_argument("--rate-limit", type=int, default=10, help="fake API requests/second")
+    p.add_argument("--max-delay", type=float, default=8.0)
+    p.add_argument("--max-elapsed", type=float, default=30.0)
+    p.add_argument("--reset-timeout", type=float, default=2.0)
+    p.set_defaults(func=bench_retry)
+
+    p = sub.add_parser("suite", help="offline per-stage benchmark with a fake Groq API")
+    p.add_argument("--pages", type=int, default=40)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--latency", type=float, default=0.2)
+    p.add_argument("--jitter", type=float, default=0.05)
+    p.add_argument("--failure-rate", type=float, default=0.05)
+    p.add_argument("--scripts", type=int, default=50)
+    p.add_argument("--questions", type=int, default=4)
+    p.add_argument("--parts", type=int, default=2)
+    p.add_argument("--depth", type=int, default=2)
+    p.add_argument("--width", type=int, default=3)
+    p.add_argument("--moderation-calls", type=int, default=4)
+    p.add_argument("--out", default=os.path.join("bench_results", f"{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    p.set_defaults(func=bench_suite)
+
+    p = sub.add_parser("compare", help="compare two suite JSON reports")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--tolerance", type=float, default=0.1)
+    p.set_defaults(func=bench_compare)
+
+    p = sub.add_parser("imports", help="import-time budget check (exit 1 on failure)")
+    p.add_argument("--budget", type=float, default=1.0)
+    p.set_defaults(func=bench_imports)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,113 @@
+import metrics
+
+# Share of a node's weight kept by the node itself; the rest goes to its sub-topics
+MAIN_RATIO = 0.3
+
+
+class Component:
+    """
+    Compact component record (__slots__, no per-instance dict).
+    Supports c["field"] / c.get() so code written for the old
+    component dicts keeps working; to_dict() for serialisation.
+    """
+    __slots__ = ("id", "question", "part", "topic", "text", "weight")
+
+    def __init__(self, id, question, part, topic, text, weight):
+        self.id = id
+        self.question = question
+        self.part = part
+        self.topic = topic
+        self.text = text
+        self.weight = weight
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return f"Component({self.to_dict()!r})"
+
+
+def subtree_texts(topic):
+    """
+    Full hierarchical text of every node in one bottom-up pass.
+    Each node's text is its own "topic. content" followed by its
+    children's (already built) texts. Iterative, so arbitrarily
+    deep trees do not hit the recursion limit.
+
+    Returns {id(node): text}
+    """
+    texts = {}
+    stack = [(topic, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+        subs = node.get("sub_topics", [])
+
+        if expanded or not subs:
+            own = f"{node.get('topic', '')}. {node.get('content', '')}".strip()
+            texts[id(node)] = " ".join([own] + [texts[id(s)] for s in subs])
+        else:
+            stack.append((node, True))
+            stack.extend((s, False) for s in subs)
+
+    return texts
+
+
 def collect_full_text(topic):
     """
-    Recursively collect text from topic and all descendants.
+    Collect text from topic and all descendants.
     Returns a single combined string.
     """
-    texts = []
+    return subtree_texts(topic)[id(topic)]
 
-    def recurse(node):
-        topic_name = node.get("topic", "")
-        content = node.get("content", "")
-        texts.append(f"{topic_name}. {content}".strip())
 
-        for sub in node.get("sub_topics", []):
-            recurse(sub)
+def flatten_topic(topic, parent_id, weight, components, question_id, part_id,
+                  main_ratio=MAIN_RATIO):
+    """
+    Append one Component per node, in pre-order.
 
-    recurse(topic)
-    return " ".join(texts)
+    A leaf keeps its whole weight. A node with sub-topics keeps
+    main_ratio of it (its text contains ALL descendant info) and
+    splits the rest evenly between its sub-topics.
+    """
+    texts = subtree_texts(topic)
+    stack = [(topic, parent_id, weight)]
 
+    while stack:
+        node, node_id, node_weight = stack.pop()
+        subs = node.get("sub_topics", [])
 
+        own_weight = node_weight * main_ratio if subs else node_weight
 
-def flatten_topic(topic, parent_id, weight, components, question_id, part_id,
-                  main_ratio=0.3):
-
-    subs = topic.get("sub_topics", [])
-
-    # FULL hierarchical text
-    full_text = collect_full_text(topic)
-
-    # ==============================
-    # CASE 1 — NO SUBTOPICS
-    # ==============================
-    if not subs:
-        components.append({
-            "id": parent_id,
-            "question": question_id,
-            "part": part_id,
-            "topic": topic.get("topic", ""),
-            "text": full_text,
-            "weight": float(weight)
-        })
-        return
-
-    # ==============================
-    # CASE 2 — HAS SUBTOPICS
-    # ==============================
-
-    main_weight = weight * main_ratio
-    remaining_weight = weight * (1 - main_ratio)
-    sub_weight = remaining_weight / len(subs)
-
-    # Parent contains ALL descendant info
-    components.append({
-        "id": parent_id,
-        "question": question_id,
-        "part": part_id,
-        "topic": topic.get("topic", ""),
-        "text": full_text,
-        "weight": float(main_weight)
-    })
-
-    # Recurse normally
-    for i, s in enumerate(subs, 1):
-        flatten_topic(
-            s,
-            f"{parent_id}.S{i}",
-            sub_weight,
-            components,
+        components.append(Component(
+            node_id,
             question_id,
             part_id,
-            main_ratio
-        )
+            node.get("topic", ""),
+            texts[id(node)],
+            float(own_weight)
+        ))
 
+        if subs:
+            sub_weight = node_weight * (1 - main_ratio) / len(subs)
 
+            # Pushed in reverse so sub-topics pop in order
+            for i in range(len(subs), 0, -1):
+                stack.append((subs[i - 1], f"{node_id}.S{i}", sub_weight))
 
 
-def build_weighted_components(extracted_papers, total_marks):
+def build_weighted_components(extracted_papers, total_marks, main_ratio=MAIN_RATIO):
     """
     extracted_papers = list of files
     each file contains multiple questions
@@ -90,25 +124,28 @@ def build_weighted_components(extracted_papers, total_marks):
 
     question_weight = total_marks / len(all_questions)
 
-    for q_index, q in enumerate(all_questions, 1):
-        qid = q.get("question_id", f"Q{q_index}")
-        parts = q.get("parts", [])
+    with metrics.span("component_building"):
+        for q_index, q in enumerate(all_questions, 1):
+            qid = q.get("question_id", f"Q{q_index}")
+            parts = q.get("parts", [])
 
-        if not parts:
-            continue
+            if not parts:
+                continue
 
-        part_weight = question_weight / len(parts)
+            part_weight = question_weight / len(parts)
 
-        for p_index, part in enumerate(parts, 1):
-            part_id = part.get("part_id", f"P{p_index}")
+            for p_index, part in enumerate(parts, 1):
+                part_id = part.get("part_id", f"P{p_index}")
 
-            flatten_topic(
-                part,
-                f"{qid}.P{p_index}",
-                part_weight,
-                components,
-                qid,
-                part_id
-            )
+                flatten_topic(
+                    part,
+                    f"{qid}.P{p_index}",
+                    part_weight,
+                    components,
+                    qid,
+                    part_id,
+                    main_ratio
+                )
 
+    metrics.incr("components", len(components))
     return components
@@ -0,0 +1,257 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+CACHE_DIR = os.getenv("MARKMASTER_CACHE_DIR", ".cache")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def sha256_hex(data):
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(*parts):
+    """
+    Combine several key parts (already hashed or short strings)
+    into one content-addressed key.
+    """
+    return sha256_hex("\x1f".join(str(p) for p in parts))
+
+
+class DiskCache:
+    """
+    SQLite-backed JSON cache with size-based LRU eviction and an
+    optional TTL (seconds since the entry was written).
+
+    Values are stored as JSON text. Hit/miss counters are kept both
+    for this process (self.hits / self.misses) and cumulatively in
+    the database so the CLI can report them.
+    """
+
+    def __init__(self, name, max_bytes=DEFAULT_MAX_BYTES, cache_dir=None, ttl=None):
+        cache_dir = cache_dir or CACHE_DIR
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.path = os.path.join(cache_dir, f"{name}.sqlite3")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)"
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )"""
+            )
+
+    def _connect(self):
+        # One short-lived connection per operation → safe from worker threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _count(self, conn, name):
+        conn.execute(
+            "INSERT INTO stats(name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    # ==============================
+    # GET / SET
+    # ==============================
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key):
+        now = time.time()
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and self._expired(row[1], now):
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+
+            if row is None:
+                self._count(conn, "misses")
+                with self._lock:
+                    self.misses += 1
+                return None
+
+            conn.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?",
+                (now, key)
+            )
+            self._count(conn, "hits")
+
+        with self._lock:
+            self.hits += 1
+        return json.loads(row[0])
+
+    def contains(self, key):
+        """
+        Presence check that does not touch counters or LRU order.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        return row is not None and not self._expired(row[0], time.time())
+
+    def set(self, key, value):
+        text = json.dumps(value)
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries(key, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, text, len(text.encode()), now, now)
+            )
+
+        if self.max_bytes:
+            self.prune(self.max_bytes)
+
+    # ==============================
+    # MAINTENANCE
+    # ==============================
+
+    def expire(self):
+        """
+        Delete entries older than the TTL. Returns number deleted.
+        """
+        if self.ttl is None:
+            return 0
+        with self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,)
+            ).rowcount
+
+    def prune(self, max_bytes):
+        """
+        Drop expired entries, then evict least recently used ones until
+        the total stored size is at most max_bytes.
+        Returns number of evicted entries.
+        """
+        evicted = self.expire()
+
+        with self._connect() as conn:
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+
+            if total <= max_bytes:
+                return evicted
+
+            rows = conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed ASC"
+            ).fetchall()
+
+            for key, size in rows:
+                if total <= max_bytes:
+                    break
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+
+        return evicted
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM stats")
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            counters = dict(conn.execute("SELECT name, value FROM stats"))
+
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+        }
+
+    def entries(self):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT key, size, created, accessed FROM entries "
+                "ORDER BY accessed DESC"
+            ).fetchall()
+
+
+# =====================================================
+# CLI
+# =====================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and prune MarkMaster caches")
+    parser.add_argument("--name", default="extraction", help="cache name (default: extraction)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("stats", help="show size and hit/miss counters")
+    sub.add_parser("list", help="list entries, most recently used first")
+
+    p = sub.add_parser("prune", help="evict LRU entries down to a size limit")
+    p.add_argument("--max-mb", type=float, required=True)
+    p.add_argument("--ttl-hours", type=float, default=None, help="also drop entries older than this")
+
+    sub.add_parser("clear", help="remove every entry and reset counters")
+
+    args = parser.parse_args()
+    ttl = getattr(args, "ttl_hours", None)
+    cache = DiskCache(args.name, max_bytes=None, ttl=ttl * 3600 if ttl else None)
+
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+
+    elif args.command == "list":
+        for key, size, created, accessed in cache.entries():
+            print(
+                f"{key[:16]}  {size:>10} B  "
+                f"created {time.strftime('%Y-%m-%d %H:%M', time.localtime(created))}  "
+                f"used {time.strftime('%Y-%m-%d %H:%M', time.localtime(accessed))}"
+            )
+
+    elif args.command == "prune":
+        evicted = cache.prune(int(args.max_mb * 1024 * 1024))
+        print(f"Evicted {evicted} entries")
+
+    elif args.command == "clear":
+        cache.clear()
+        print("Cache cleared")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,129 @@
-from sentence_transformers import SentenceTransformer
-import hashlib
+import os
+import threading
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
-_cache = {}
+import numpy as np
 
-def embed(texts):
+import metrics
+from embedding_store import EmbeddingStore, as_stored
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+EMBED_BATCH_SIZE = 64
+
+# torch = fp32 PyTorch, onnx = ONNX Runtime export, int8 = dynamic int8 quantisation
+BACKENDS = ("torch", "onnx", "int8")
+EMBED_BACKEND = os.getenv("MARKMASTER_EMBED_BACKEND", "torch")
+
+_models = {}
+_stores = {}
+_lock = threading.Lock()
+
+
+def _resolve_backend(backend):
+    backend = backend or EMBED_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+    return backend
+
+
+def _load_model(backend):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        # Requires: pip install "sentence-transformers[onnx]"
+        return SentenceTransformer(MODEL_NAME, backend="onnx", device="cpu")
+
+    if backend == "int8":
+        import torch
+
+        model = SentenceTransformer(MODEL_NAME, device="cpu")
+        return torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+    return SentenceTransformer(MODEL_NAME)
+
+
+def get_model(backend=None):
+    """
+    Process-wide SentenceTransformer for the backend, loaded on first
+    use so that importing this module does not pull in torch.
+    """
+    backend = _resolve_backend(backend)
+
+    if backend not in _models:
+        with _lock:
+            if backend not in _models:
+                _models[backend] = _load_model(backend)
+
+    return _models[backend]
+
+
+def get_store(backend=None):
+    backend = _resolve_backend(backend)
+
+    if backend not in _stores:
+        dim = get_model(backend).get_sentence_embedding_dimension()
+        # Backends produce slightly different vectors → separate stores
+        name = MODEL_NAME if backend == "torch" else f"{MODEL_NAME}@{backend}"
+        with _lock:
+            if backend not in _stores:
+                _stores[backend] = EmbeddingStore(name, dim)
+
+    return _stores[backend]
+
+
+def warmup(backend=None):
+    """
+    Load the model and run one encode so the first real request
+    does not pay for weight loading / graph setup.
+    """
+    get_store(backend)
+    get_model(backend).encode(["warmup"], show_progress_bar=False)
+
+
+def embed(texts, batch_size=EMBED_BATCH_SIZE, backend=None):
+    """
+    Embed texts and return a contiguous (len(texts), dim) float32 matrix
+    of L2-normalised vectors. Cache misses are encoded in batches.
+    """
     if isinstance(texts, str):
         texts = [texts]
 
-    vectors = []
-    for t in texts:
-        key = hashlib.md5(t.encode()).hexdigest()
-        if key not in _cache:
-            _cache[key] = model.encode(t)
-        vectors.append(_cache[key])
+    store = get_store(backend)
+
+    if not texts:
+        return np.empty((0, store.dim), dtype=np.float32)
+
+    keys = [store.key(t) for t in texts]
+    vectors = store.get_many(set(keys))
+
+    # Unique misses only, in first-seen order
+    missing = {}
+    for key, t in zip(keys, texts):
+        if key not in vectors and key not in missing:
+            missing[key] = t
+
+    metrics.incr("embedding.texts", len(texts))
+    metrics.incr("embedding.cache_hits", len(texts) - len(missing))
+    metrics.incr("embedding.cache_misses", len(missing))
+
+    if missing:
+        with metrics.span("embedding.encode"):
+            encoded = get_model(backend).encode(
+                list(missing.values()),
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+
+        # Same precision as a later cache hit → identical scores either way
+        new_items = list(zip(missing, as_stored(encoded)))
+        store.put_many(new_items)
+        vectors.update(new_items)
+
+    matrix = np.ascontiguousarray(np.stack([vectors[k] for k in keys]), dtype=np.float32)
 
-    return vectors
+    # Vectors read back from the float16 store drift slightly off unit length
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return matrix
@@ -0,0 +1,287 @@
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows → single-writer only
+    fcntl = None
+
+from disk_cache import CACHE_DIR
+
+
+DEFAULT_MEMORY_ITEMS = 20000
+
+# Vectors are stored as float16 after a header recording their dimension
+STORE_DTYPE = np.float16
+HEADER = struct.Struct("<6sxxI4x")
+HEADER_MAGIC = b"MMEMB1"
+
+
+def as_stored(vectors):
+    """
+    float32 vectors exactly as they read back from disk, so a fresh
+    encode and a cache hit give identical scores.
+    """
+    return np.asarray(vectors).astype(STORE_DTYPE).astype(np.float32)
+
+
+def normalise_text(text):
+    """
+    Collapse OCR whitespace noise so "a  b\\n c" and "a b c" share a key.
+    """
+    return " ".join(text.split())
+
+
+def embedding_key(model_name, text):
+    return hashlib.sha1(f"{model_name}\x1f{normalise_text(text)}".encode()).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Two-level embedding cache.
+
+    - Memory: bounded LRU of float32 vectors (max_memory_items)
+    - Disk:   append-only float16 matrix (<model>.f16, after a header
+              with the dimension), memory-mapped read-only, plus a key
+              index (<model>.keys, one key per row)
+
+    Vectors computed in earlier runs are reused on cold start, and any
+    number of processes can map the same files. Writers append under an
+    exclusive file lock; readers pick up new rows when the index grows.
+    """
+
+    def __init__(self, model_name, dim, cache_dir=None,
+                 max_memory_items=DEFAULT_MEMORY_ITEMS, read_only=False):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_memory_items = max_memory_items
+        self.read_only = read_only
+
+        base = os.path.join(cache_dir or CACHE_DIR, "embeddings")
+        os.makedirs(base, exist_ok=True)
+
+        stem = model_name.replace("/", "__")
+        self.vectors_path = os.path.join(base, f"{stem}.f16")
+        self.keys_path = os.path.join(base, f"{stem}.keys")
+        self.lock_path = os.path.join(base, f"{stem}.lock")
+
+        self._memory = OrderedDict()
+        self._index = {}
+        self._index_offset = 0
+        self._rows = 0          # lines in the key file = rows with a key
+        self._mmap = None
+        self._lock = threading.Lock()
+
+        self._disk_ok = True
+        self._check_header()
+        self._refresh_index()
+
+    # ==============================
+    # DISK INDEX / MMAP
+    # ==============================
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.lock_path, "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_header(self):
+        try:
+            with open(self.vectors_path, "rb") as f:
+                magic, dim = HEADER.unpack(f.read(HEADER.size))
+        except (OSError, struct.error):
+            return None
+        return dim if magic == HEADER_MAGIC else None
+
+    def _reset_files(self):
+        with open(self.vectors_path, "wb") as f:
+            f.write(HEADER.pack(HEADER_MAGIC, self.dim))
+        open(self.keys_path, "wb").close()
+
+    def _check_header(self):
+        """
+        Files without a header, or written for another dimension, are
+        rebuilt empty (a read-only store just ignores them).
+        """
+        with self._file_lock():
+            if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path):
+                dim = self._read_header()
+                if dim == self.dim:
+                    return
+                print(f"⚠️ Embedding store {self.vectors_path}: dimension {dim} != {self.dim}")
+            elif not os.path.exists(self.keys_path) or not os.path.getsize(self.keys_path):
+                # Fresh store
+                if not self.read_only:
+                    self._reset_files()
+                return
+            else:
+                print(f"⚠️ Embedding store {self.keys_path}: keys without vectors")
+
+            if self.read_only:
+                self._disk_ok = False
+            else:
+                self._reset_files()
+
+    def _refresh_index(self):
+        if not self._disk_ok or not os.path.exists(self.keys_path):
+            return
+
+        size = os.path.getsize(self.keys_path)
+        if size < self._index_offset:
+            # Rebuilt by another process → start over
+            self._index = {}
+            self._index_offset = 0
+            self._rows = 0
+            self._mmap = None
+        elif size == self._index_offset:
+            return
+
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._index_offset)
+            chunk = f.read()
+
+        # Ignore a trailing partial line from a concurrent writer
+        complete = chunk[:chunk.rfind(b"\n") + 1]
+        row = self._rows
+        for line in complete.splitlines():
+            self._index.setdefault(line.decode(), row)
+            row += 1
+
+        self._rows = row
+        self._index_offset += len(complete)
+        self._mmap = None
+
+    def _vectors(self):
+        if self._mmap is None and self._disk_ok and os.path.exists(self.vectors_path):
+            rows = (os.path.getsize(self.vectors_path) - HEADER.size) // (self.dim * 2)
+            if rows > 0:
+                self._mmap = np.memmap(
+                    self.vectors_path, dtype=STORE_DTYPE, mode="r",
+                    offset=HEADER.size, shape=(rows, self.dim)
+                )
+        return self._mmap
+
+    def _read_disk(self, key):
+        row = self._index.get(key)
+        if row is None:
+            return None
+
+        vectors = self._vectors()
+        if vectors is None or row >= vectors.shape[0]:
+            return None
+
+        return np.asarray(vectors[row], dtype=np.float32)
+
+    def _append_disk(self, items):
+        with self._file_lock():
+            # Another process may have written some of these meanwhile
+            self._refresh_index()
+            items = [(k, v) for k, v in items if k not in self._index]
+            if not items:
+                return
+
+            self._drop_orphans()
+
+            # Vectors first so the index never points past the data
+            matrix = np.stack([v for _, v in items]).astype(STORE_DTYPE)
+            with open(self.vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write("".join(f"{k}\n" for k, _ in items).encode())
+
+            self._refresh_index()
+
+    def _drop_orphans(self):
+        """
+        Called under the file lock. A writer that died between (or during)
+        the two appends leaves vector rows without a key and / or a partial
+        key line; cut both back so new keys line up with their rows again.
+        Readers never map past their own index, so the cut rows are unused.
+        Keys pointing past the vector data (never written that way) make
+        the store unusable, so it is rebuilt.
+        """
+        if os.path.exists(self.keys_path) and os.path.getsize(self.keys_path) > self._index_offset:
+            os.truncate(self.keys_path, self._index_offset)
+
+        size = HEADER.size + self._rows * self.dim * 2
+        actual = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if actual > size:
+            os.truncate(self.vectors_path, size)
+            self._mmap = None
+        elif actual < size:
+            print(f"⚠️ Embedding store {self.vectors_path}: keys past the vector data, rebuilding")
+            self._reset_files()
+            self._refresh_index()
+
+    # ==============================
+    # MEMORY LRU
+    # ==============================
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    # ==============================
+    # PUBLIC API
+    # ==============================
+
+    def key(self, text):
+        return embedding_key(self.model_name, text)
+
+    def get_many(self, keys):
+        """
+        Return {key: vector} for every key found in memory or on disk.
+        """
+        found = {}
+
+        with self._lock:
+            self._refresh_index()
+
+            for key in keys:
+                vec = self._memory.get(key)
+                if vec is None:
+                    vec = self._read_disk(key)
+                    if vec is None:
+                        continue
+                self._remember(key, vec)
+                found[key] = vec
+
+        return found
+
+    def put_many(self, items):
+        """
+        items = list of (key, float32 vector); vectors are kept (in memory
+        too) at the stored float16 precision - see as_stored().
+        """
+        if not items:
+            return
+
+        items = [(key, as_stored(vec)) for key, vec in items]
+
+        with self._lock:
+            for key, vec in items:
+                self._remember(key, vec)
+
+            if not self.read_only:
+                self._append_disk(items)
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+    def __len__(self):
+        return len(self._index)
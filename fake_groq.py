@@ -0,0 +1,214 @@
+import collections
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+
+DEFAULT_EXTRACTION = {
+    "questions": [
+        {
+            "question_id": "Q1",
+            "question_title": "",
+            "parts": [
+                {
+                    "part_id": "main",
+                    "topic": "Photosynthesis",
+                    "content": "Plants convert light energy into chemical energy.",
+                    "sub_topics": [
+                        {
+                            "topic": "Light reactions",
+                            "content": "Occur in the thylakoid membrane and produce ATP.",
+                            "sub_topics": []
+                        }
+                    ]
+                }
+            ]
+        }
+    ]
+}
+
+
+class FakeAPIError(RuntimeError):
+    """
+    Carries status_code / retry_after like groq.APIStatusError does.
+    """
+
+    def __init__(self, message, status_code=500, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _Completions:
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, **kwargs):
+        return self.owner._respond(kwargs)
+
+
+DEFAULT_MODERATION = """
+1. Both graders broadly agree on the core concepts.
+2. The AI rewarded partial explanations the human marked down.
+3. Verdict: AI grading is reliable for this question.
+4. AI grading quality: 8/10
+"""
+
+
+def count_images(kwargs):
+    return sum(
+        1
+        for message in kwargs.get("messages", [])
+        if isinstance(message.get("content"), list)
+        for part in message["content"]
+        if part.get("type") == "image_url"
+    )
+
+
+class FakeGroq:
+    """
+    Local stand-in for groq.Groq used by the benchmarks.
+    Mimics client.chat.completions.create() with a configurable latency
+    (± uniform jitter), a random failure rate and canned responses:
+    JSON-mode calls (extraction) get `response`, others (moderation)
+    get `text_response`. Either may be a callable taking the request kwargs.
+    Calls slower than their `timeout` raise TimeoutError.
+
+    latency_per_image: extra latency for every image in the request
+    rate_limit: max requests per second; calls over it get a 429 whose
+        Retry-After is the time until a slot frees up
+    outage: every call fails with 503 for this many seconds after creation
+    """
+
+    def __init__(self, latency=0.5, failure_rate=0.0, response=None, seed=0,
+                 jitter=0.0, text_response=DEFAULT_MODERATION,
+                 rate_limit=None, outage=0.0, latency_per_image=0.0):
+        self.latency = latency
+        self.latency_per_image = latency_per_image
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.rate_limited = 0
+        self._recent = collections.deque()
+        self.outage_until = time.monotonic() + outage
+        self.response = response if response is not None else DEFAULT_EXTRACTION
+        self.text_response = text_response
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def _over_rate_limit(self):
+        """
+        Sliding one-second window; returns seconds to wait, or None if the
+        call is allowed. Called with the lock held.
+        """
+        if not self.rate_limit:
+            return None
+
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 1.0:
+            self._recent.popleft()
+
+        if len(self._recent) >= self.rate_limit:
+            self.rate_limited += 1
+            return round(1.0 - (now - self._recent[0]), 3)
+
+        self._recent.append(now)
+        return None
+
+    def _respond(self, kwargs):
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.failure_rate
+            delay = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+            delay += self.latency_per_image * count_images(kwargs)
+            retry_after = self._over_rate_limit()
+
+        if time.monotonic() < self.outage_until:
+            time.sleep(min(delay, 0.05))
+            raise FakeAPIError("Fake API unavailable", status_code=503)
+
+        if retry_after is not None:
+            raise FakeAPIError("Fake rate limit", status_code=429, retry_after=retry_after)
+
+        timeout = kwargs.get("timeout")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("Fake API timeout")
+
+        time.sleep(max(0.0, delay))
+
+        if fail:
+            raise FakeAPIError("Fake API error")
+
+        content = self.response if "response_format" in kwargs else self.text_response
+        if callable(content):
+            content = content(kwargs)
+        if not isinstance(content, str):
+            content = json.dumps(content)
+
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+# =====================================================
+# LOCAL STAND-IN SERVER — the real HTTP path, offline
+# =====================================================
+
+def serve(fake=None, host="127.0.0.1", port=0):
+    """
+    Serve a FakeGroq over HTTP as an OpenAI-style chat completions
+    endpoint, so llm_client.GroqProvider(base_url=...) and its connection
+    pool can be exercised without the real API.
+    Returns (server, base_url); stop with server.shutdown().
+    """
+    fake = fake or FakeGroq(latency=0.0)
+
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 → connections are kept alive between requests
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            retry_after = None
+            try:
+                content = fake._respond(request).choices[0].message.content
+                status = 200
+                body = {
+                    "id": f"fake-{fake.calls}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", ""),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }
+            except Exception as e:
+                status = getattr(e, "status_code", 500)
+                retry_after = getattr(e, "retry_after", None)
+                body = {"error": {"message": str(e), "type": "server_error"}}
+
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            if retry_after is not None:
+                self.send_header("Retry-After", str(retry_after))
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
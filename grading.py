@@ -0,0 +1,52 @@
+import metrics
+from embedder import embed
+from matcher import score_student_answer
+
+
+def embed_model_questions(model_by_q):
+    """
+    Embed every question's model components once → {qid: matrix}
+    """
+    return {
+        qid: embed([c["text"] for c in components])
+        for qid, components in model_by_q.items()
+    }
+
+
+def score_questions(model_by_q, student_by_q, total_marks,
+                    model_embs=None, assignment="greedy"):
+    """
+    Score a student question by question against the model answer.
+    Marks are split evenly across the model's questions.
+
+    Returns (question_scores, question_breakdowns, total_score)
+    """
+    question_scores = {}
+    question_breakdowns = {}
+    total_score = 0
+
+    if not model_by_q:
+        return question_scores, question_breakdowns, total_score
+
+    q_marks = total_marks / len(model_by_q)
+
+    for qid, q_model in model_by_q.items():
+        q_student = student_by_q.get(qid, [])
+
+        metrics.observe("components_per_question.model", len(q_model))
+        metrics.observe("components_per_question.student", len(q_student))
+
+        with metrics.span("matching"):
+            score, breakdown = score_student_answer(
+                q_model,
+                q_student,
+                total_marks=q_marks,
+                assignment=assignment,
+                model_embs=model_embs.get(qid) if model_embs else None
+            )
+
+        question_scores[qid] = score
+        question_breakdowns[qid] = breakdown
+        total_score += score
+
+    return question_scores, question_breakdowns, total_score
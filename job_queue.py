@@ -0,0 +1,418 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+
+from disk_cache import CACHE_DIR, make_key
+
+
+JOBS_DB = os.path.join(CACHE_DIR, "jobs.sqlite3")
+# Uploaded pages are spooled here so a worker process can read them;
+# spools unused this long and not needed by an unfinished job are pruned
+UPLOAD_DIR = os.path.join(CACHE_DIR, "uploads")
+UPLOAD_TTL = 24 * 3600
+
+# A running job whose worker has not sent a heartbeat for this long is
+# considered abandoned and handed to the next worker (which resumes it)
+STALE_AFTER = 120.0
+
+# Stages in order; a job records the last one it completed
+STAGES = ("queued", "scheme", "extract", "score", "done")
+
+
+class JobQueue:
+    """
+    Durable grading job queue in one SQLite file.
+
+    jobs       one row per submission: status, last completed stage,
+               per-page progress, result / error
+    artifacts  JSON output of completed stages and extracted pages,
+               so a restarted job resumes instead of starting over
+    workers    worker heartbeats (used to tell whether any are running)
+    """
+
+    def __init__(self, path=None):
+        self.path = path or JOBS_DB
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    pages_done INTEGER NOT NULL DEFAULT 0,
+                    pages_total INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    worker TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    heartbeat REAL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs(key)")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS artifacts (
+                    job_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (job_id, name)
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS workers (
+                    id TEXT PRIMARY KEY,
+                    heartbeat REAL NOT NULL
+                )"""
+            )
+
+    def _connect(self):
+        # One short-lived connection per operation → safe from threads / processes
+        return sqlite3.connect(self.path, timeout=30)
+
+    # ==============================
+    # SUBMIT / CLAIM
+    # ==============================
+
+    def submit(self, model_source, student_source, total_marks, assignment="greedy",
+               model_hash="", student_hash=""):
+        """
+        Queue a grading job. model_source / student_source are folder
+        paths. An identical job (same content hashes, marks and assignment)
+        that is queued, running or done is reused instead, and a partial
+        one (some pages failed) is re-queued to retry those pages. Without
+        both hashes only the folder paths are known, so only a queued or
+        running job is reused, never a finished result.
+        Returns the job id.
+        """
+        params = {
+            "model_source": os.path.abspath(model_source),
+            "student_source": os.path.abspath(student_source),
+            "total_marks": float(total_marks),
+            "assignment": assignment,
+            "model_hash": model_hash,
+            "student_hash": student_hash,
+        }
+        key = make_key(
+            model_hash or params["model_source"],
+            student_hash or params["student_source"],
+            params["total_marks"],
+            assignment
+        )
+        now = time.time()
+
+        with self._connect() as conn:
+            reusable = ("queued", "running", "done") if model_hash and student_hash \
+                else ("queued", "running")
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE key = ? AND status IN ({', '.join('?' * len(reusable))}) "
+                "ORDER BY created DESC LIMIT 1",
+                (key, *reusable)
+            ).fetchone()
+            if row:
+                return row[0]
+
+            if model_hash and student_hash:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE key = ? AND status = 'partial' "
+                    "ORDER BY created DESC LIMIT 1",
+                    (key,)
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued', updated = ? WHERE id = ?",
+                        (now, row[0])
+                    )
+                    return row[0]
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs(id, key, status, stage, params, created, updated) "
+                "VALUES (?, ?, 'queued', 'queued', ?, ?, ?)",
+                (job_id, key, json.dumps(params), now, now)
+            )
+
+        return job_id
+
+    def claim(self, worker_id):
+        """
+        Atomically take the oldest queued job, or a running job whose
+        worker stopped sending heartbeats. Returns the job dict or None.
+        """
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND heartbeat < ?) "
+                "ORDER BY created LIMIT 1",
+                (now - STALE_AFTER,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?, "
+                "updated = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker_id, now, now, row[0])
+            )
+
+        return self.get(row[0])
+
+    # ==============================
+    # PROGRESS
+    # ==============================
+
+    def heartbeat(self, job_id=None, worker_id=None):
+        now = time.time()
+        with self._connect() as conn:
+            if job_id:
+                conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (now, job_id))
+            if worker_id:
+                conn.execute(
+                    "INSERT OR REPLACE INTO workers(id, heartbeat) VALUES (?, ?)",
+                    (worker_id, now)
+                )
+
+    def set_stage(self, job_id, stage):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET stage = ?, updated = ? WHERE id = ?",
+                (stage, time.time(), job_id)
+            )
+
+    def set_progress(self, job_id, pages_done, pages_total):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET pages_done = ?, pages_total = ?, updated = ?, "
+                "heartbeat = ? WHERE id = ?",
+                (pages_done, pages_total, now, now, job_id)
+            )
+
+    def save_artifact(self, job_id, name, value):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts(job_id, name, value) VALUES (?, ?, ?)",
+                (job_id, name, json.dumps(value))
+            )
+
+    def artifacts(self, job_id, prefix=""):
+        """
+        {name: value} of a job's artifacts whose name starts with prefix.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT name, value FROM artifacts WHERE job_id = ? AND substr(name, 1, ?) = ?",
+                (job_id, len(prefix), prefix)
+            ).fetchall()
+        return {name: json.loads(value) for name, value in rows}
+
+    def complete(self, job_id, result):
+        """
+        Store the result. A job with failed_pages ends 'partial': it is not
+        reused by submit(), and keeps its page artifacts so retry() only
+        re-extracts the failed pages.
+        """
+        now = time.time()
+        partial = bool(result.get("failed_pages"))
+
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, result = ?, "
+                "error = NULL, updated = ? WHERE id = ?",
+                (
+                    "partial" if partial else "done",
+                    "scheme" if partial else "done",
+                    json.dumps(result), now, job_id
+                )
+            )
+            if not partial:
+                # Stage outputs are folded into the result now
+                conn.execute("DELETE FROM artifacts WHERE job_id = ?", (job_id,))
+
+    def fail(self, job_id, error):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+                (str(error), time.time(), job_id)
+            )
+
+    def retry(self, job_id):
+        """
+        Put a failed or partial job back in the queue; it resumes from its
+        last stage (a partial job only re-extracts its failed pages).
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', error = NULL, updated = ? "
+                "WHERE id = ? AND status IN ('failed', 'partial')",
+                (time.time(), job_id)
+            )
+
+    # ==============================
+    # INSPECTION
+    # ==============================
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def jobs(self, status=None, limit=50):
+        with self._connect() as conn:
+            if status:
+                rows = conn.execute(
+                    "SELECT id, status, stage, pages_done, pages_total, updated FROM jobs "
+                    "WHERE status = ? ORDER BY created DESC LIMIT ?",
+                    (status, limit)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT id, status, stage, pages_done, pages_total, updated FROM jobs "
+                    "ORDER BY created DESC LIMIT ?",
+                    (limit,)
+                ).fetchall()
+        return rows
+
+    def prune_uploads(self, older_than=UPLOAD_TTL):
+        """
+        Delete spooled upload folders untouched for older_than seconds that
+        no queued / running / failed job reads. Returns how many went.
+        """
+        if not os.path.isdir(UPLOAD_DIR):
+            return 0
+
+        with self._connect() as conn:
+            rows = conn.execute("SELECT params FROM jobs WHERE status != 'done'").fetchall()
+        in_use = {
+            os.path.abspath(json.loads(params)[source])
+            for (params,) in rows
+            for source in ("model_source", "student_source")
+        }
+
+        removed = 0
+        cutoff = time.time() - older_than
+        for name in os.listdir(UPLOAD_DIR):
+            folder = os.path.abspath(os.path.join(UPLOAD_DIR, name))
+            try:
+                if folder in in_use or os.path.getmtime(folder) > cutoff:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(folder, ignore_errors=True)
+            removed += 1
+
+        return removed
+
+    def active_workers(self, within=STALE_AFTER):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat >= ?",
+                (time.time() - within,)
+            ).fetchone()[0]
+
+
+def spool_uploads(uploaded_files, content_hash):
+    """
+    Write in-memory uploads to UPLOAD_DIR/<content_hash>/ (once per
+    content) so a worker process can read them. Returns the folder.
+    """
+    folder = os.path.join(UPLOAD_DIR, content_hash)
+    if os.path.isdir(folder):
+        # Reused → not a pruning candidate for another UPLOAD_TTL
+        os.utime(folder)
+        return folder
+
+    tmp = f"{folder}.tmp-{uuid.uuid4().hex[:8]}"
+    os.makedirs(tmp)
+    for file in uploaded_files:
+        with open(os.path.join(tmp, os.path.basename(file.name)), "wb") as f:
+            f.write(file.getbuffer())
+
+    try:
+        os.replace(tmp, folder)
+    except OSError:
+        # Another session spooled the same content first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return folder
+
+
+# =====================================================
+# CLI
+# =====================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the MarkMaster job queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("submit", help="queue a grading job")
+    p.add_argument("model_folder")
+    p.add_argument("student_folder")
+    p.add_argument("--total-marks", type=float, default=20)
+    p.add_argument("--assignment", choices=["greedy", "optimal"], default="greedy")
+
+    p = sub.add_parser("list", help="recent jobs")
+    p.add_argument("--status", default=None)
+
+    p = sub.add_parser("show", help="one job's status / result")
+    p.add_argument("job_id")
+
+    p = sub.add_parser("retry", help="re-queue a failed / partial job")
+    p.add_argument("job_id")
+
+    p = sub.add_parser("prune", help="delete old spooled uploads")
+    p.add_argument("--ttl-hours", type=float, default=UPLOAD_TTL / 3600)
+
+    args = parser.parse_args()
+    queue = JobQueue()
+
+    if args.command == "submit":
+        from scheme import folder_hash
+
+        print(queue.submit(
+            args.model_folder, args.student_folder, args.total_marks, args.assignment,
+            model_hash=folder_hash(args.model_folder),
+            student_hash=folder_hash(args.student_folder)
+        ))
+
+    elif args.command == "list":
+        for job_id, status, stage, done, total, updated in queue.jobs(args.status):
+            print(
+                f"{job_id}  {status:<8} {stage:<8} pages {done}/{total}  "
+                f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(updated))}"
+            )
+
+    elif args.command == "show":
+        job = queue.get(args.job_id)
+        print(json.dumps(job, indent=2) if job else "No such job")
+
+    elif args.command == "retry":
+        queue.retry(args.job_id)
+        print("Re-queued")
+
+    elif args.command == "prune":
+        print(f"Removed {queue.prune_uploads(args.ttl_hours * 3600)} upload folder(s)")
+
+
+if __name__ == "__main__":
+    main()
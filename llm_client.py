@@ -0,0 +1,314 @@
+import asyncio
+import json
+import os
+import threading
+import weakref
+from types import SimpleNamespace
+
+from disk_cache import CACHE_DIR, sha256_hex
+
+# Per-call timeout (seconds) when the caller does not give one
+LLM_TIMEOUT = 60.0
+
+# One HTTP connection pool shared by extraction and moderation
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+KEEPALIVE_EXPIRY = 30.0
+
+# groq (default) | fake | replay | record — see provider_from_env()
+LLM_PROVIDER = os.getenv("MARKMASTER_LLM_PROVIDER", "groq")
+# Point the Groq provider at a local stand-in server (e.g. fake_groq.serve)
+LLM_BASE_URL = os.getenv("MARKMASTER_LLM_BASE_URL") or None
+REPLAY_FILE = os.getenv(
+    "MARKMASTER_LLM_REPLAY_FILE",
+    os.path.join(CACHE_DIR, "llm_replay.jsonl")
+)
+
+
+# =====================================================
+# PROVIDERS
+#   create(**request)         → response with .choices[0].message.content
+#   await acreate(**request)  → same, without blocking the event loop
+#   request = chat.completions.create kwargs (+ timeout)
+# =====================================================
+
+class Provider:
+    """
+    Base LLM provider. Subclasses implement create(); acreate() defaults
+    to running create() in a worker thread. `name` identifies where answers
+    come from; it is part of every cache key built on LLM output, so
+    canned / recorded answers never mix with real ones.
+    """
+
+    name = "unknown"
+
+    def create(self, **request):
+        raise NotImplementedError
+
+    async def acreate(self, **request):
+        return await asyncio.to_thread(self.create, **request)
+
+    def close(self):
+        pass
+
+
+class GroqProvider(Provider):
+    """
+    Groq API over pooled keep-alive HTTP connections.
+    Importing groq / httpx is deferred until the first call.
+    """
+
+    def __init__(self, api_key=None, base_url=LLM_BASE_URL, timeout=LLM_TIMEOUT,
+                 max_connections=MAX_CONNECTIONS,
+                 max_keepalive=MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry=KEEPALIVE_EXPIRY):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        # A custom base_url is a stand-in server, not the Groq API
+        self.name = "groq" if base_url is None else f"groq@{base_url}"
+        self._client = None
+        # httpx.AsyncClient is bound to the loop it was first used on
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _limits(self):
+        import httpx
+
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def _api_key(self):
+        if self.api_key is None:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            self.api_key = os.getenv("GROQ_API_KEY")
+        return self.api_key
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+                    from groq import Groq
+
+                    self._client = Groq(
+                        api_key=self._api_key(),
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        http_client=httpx.Client(limits=self._limits(), timeout=self.timeout)
+                    )
+        return self._client
+
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            import httpx
+            from groq import AsyncGroq
+
+            client = AsyncGroq(
+                api_key=self._api_key(),
+                base_url=self.base_url,
+                timeout=self.timeout,
+                http_client=httpx.AsyncClient(limits=self._limits(), timeout=self.timeout)
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def create(self, **request):
+        return self.client.chat.completions.create(**request)
+
+    async def acreate(self, **request):
+        return await self.async_client().chat.completions.create(**request)
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class ClientProvider(Provider):
+    """
+    Any object exposing chat.completions.create() (a groq.Groq instance,
+    fake_groq.FakeGroq …) used as a provider.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        cls = type(client)
+        self.name = "groq" if cls.__module__.split(".")[0] == "groq" else f"client:{cls.__name__}"
+
+    def create(self, **request):
+        return self.client.chat.completions.create(**request)
+
+
+def _request_key(request):
+    # Timeouts do not change the answer
+    body = {k: v for k, v in request.items() if k != "timeout"}
+    return sha256_hex(json.dumps(body, sort_keys=True, default=str))
+
+
+def _as_response(record):
+    message = SimpleNamespace(content=record["content"])
+    usage = SimpleNamespace(**record["usage"]) if record.get("usage") else None
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class ReplayProvider(Provider):
+    """
+    Recorded responses, one JSON line per request:
+        {"key": <request hash>, "content": ..., "usage": {...}}
+
+    With `inner`, requests missing from the file are sent to the inner
+    provider and appended (record mode); without it they raise KeyError.
+    """
+
+    def __init__(self, path=REPLAY_FILE, inner=None):
+        self.path = path
+        self.inner = inner
+        self.name = f"replay:{inner.name}" if inner is not None else "replay"
+        self._records = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._records[record["key"]] = record
+
+    def __len__(self):
+        return len(self._records)
+
+    def _record(self, key, response):
+        usage = getattr(response, "usage", None)
+        record = {
+            "key": key,
+            "content": response.choices[0].message.content,
+            "usage": {
+                k: getattr(usage, k, 0) or 0
+                for k in ("prompt_tokens", "completion_tokens", "total_tokens")
+            } if usage is not None else None,
+        }
+
+        with self._lock:
+            self._records[key] = record
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def create(self, **request):
+        key = _request_key(request)
+        record = self._records.get(key)
+        if record is not None:
+            return _as_response(record)
+
+        if self.inner is None:
+            raise KeyError(f"No recorded response for request {key[:12]}")
+
+        response = self.inner.create(**request)
+        self._record(key, response)
+        return response
+
+    async def acreate(self, **request):
+        key = _request_key(request)
+        record = self._records.get(key)
+        if record is not None:
+            return _as_response(record)
+
+        if self.inner is None:
+            raise KeyError(f"No recorded response for request {key[:12]}")
+
+        response = await self.inner.acreate(**request)
+        self._record(key, response)
+        return response
+
+
+def provider_from_env(name=LLM_PROVIDER):
+    """
+    groq   → GroqProvider
+    fake   → FakeGroq (offline, canned answers)
+    replay → ReplayProvider(REPLAY_FILE), recorded answers only
+    record → ReplayProvider(REPLAY_FILE) recording real Groq calls
+    """
+    if name == "groq":
+        return GroqProvider()
+    if name == "fake":
+        from fake_groq import FakeGroq
+
+        return ClientProvider(FakeGroq(latency=0.0))
+    if name == "replay":
+        return ReplayProvider(REPLAY_FILE)
+    if name == "record":
+        return ReplayProvider(REPLAY_FILE, inner=GroqProvider())
+    raise ValueError(f"Unknown LLM provider '{name}'")
+
+
+# =====================================================
+# SHARED TRANSPORT
+# =====================================================
+
+_provider = None
+_lock = threading.Lock()
+
+
+def get_provider():
+    """
+    Process-wide provider, created on first use (MARKMASTER_LLM_PROVIDER).
+    """
+    global _provider
+
+    if _provider is None:
+        with _lock:
+            if _provider is None:
+                _provider = provider_from_env()
+
+    return _provider
+
+
+def set_provider(provider):
+    """
+    Replace the shared provider. A plain client object (anything with
+    chat.completions.create) is wrapped in ClientProvider; None resets
+    to the default on next use. Returns the previous provider.
+    """
+    global _provider
+
+    if provider is not None and not isinstance(provider, Provider):
+        provider = ClientProvider(provider)
+
+    with _lock:
+        previous = _provider
+        _provider = provider
+
+    return previous
+
+
+def provider_name():
+    """
+    Identity of the shared provider, for cache keys.
+    """
+    return get_provider().name
+
+
+def complete(timeout=None, **request):
+    """
+    chat.completions.create through the shared provider and pool.
+    """
+    return get_provider().create(timeout=timeout or LLM_TIMEOUT, **request)
+
+
+async def acomplete(timeout=None, **request):
+    """
+    Async complete(): many calls can share the pool from one event loop.
+    """
+    return await get_provider().acreate(timeout=timeout or LLM_TIMEOUT, **request)
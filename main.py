@@ -1,81 +1,62 @@
 import json
-from text_extracr import process_folder
-from component_builder import build_weighted_components
-from matcher import score_student_answer
+import metrics
 from objective_2 import run_objective_2
-from question_groupby import group_by_question
+from pipeline import grade_folders
 
 MODEL_FOLDER = "model_answer"
 STUDENT_FOLDER = "student_answer"
 TOTAL_MARKS = 20
 
-model_answer = process_folder(MODEL_FOLDER)
-student_answer = process_folder(STUDENT_FOLDER)
 
+# Pre-processing runs in spawned processes, which re-import this module:
+# the run must only start from the guard below
+def main():
+    result = grade_folders(MODEL_FOLDER, STUDENT_FOLDER, TOTAL_MARKS)
 
+    model_answer = result["model_answer"]
+    student_answer = result["student_answer"]
 
-# model_components = build_weighted_components(model_answer, TOTAL_MARKS)
-# student_components = build_weighted_components(student_answer, TOTAL_MARKS)
+    # model_components = build_weighted_components(model_answer, TOTAL_MARKS)
+    # student_components = build_weighted_components(student_answer, TOTAL_MARKS)
 
+    # final_score, breakdown = score_student_answer(
+    #     model_components,
+    #     student_components,
+    #     total_marks=TOTAL_MARKS
+    # )
 
-# final_score, breakdown = score_student_answer(
-#     model_components,
-#     student_components,
-#     total_marks=TOTAL_MARKS
-# )
+    question_scores = result["question_scores"]
+    question_breakdowns = result["question_breakdowns"]
+    total_score = result["total_score"]
 
-model_components = build_weighted_components(model_answer, TOTAL_MARKS)
-student_components = build_weighted_components(student_answer, TOTAL_MARKS)
+    final_score = total_score
 
-model_by_q = group_by_question(model_components)
-student_by_q = group_by_question(student_components)
+    print("\n================ FINAL RESULT ================\n")
 
-question_scores = {}
-question_breakdowns = {}
+    for qid in question_scores:
+        print(f"{qid} SCORE: {round(question_scores[qid],2)}")
 
-total_score = 0
+    print(f"\nTOTAL SCORE: {round(total_score,2)} / {TOTAL_MARKS}\n")
 
-for qid in model_by_q.keys():
+    print("Detailed Breakdown:")
+    print(json.dumps(question_breakdowns, indent=2))
 
-    q_model = model_by_q.get(qid, [])
-    q_student = student_by_q.get(qid, [])
-
-    q_marks = TOTAL_MARKS / len(model_by_q)
-
-    score, breakdown = score_student_answer(
-        q_model,
-        q_student,
-        total_marks=q_marks
+    analysis = run_objective_2(
+        model_answer=model_answer,
+        student_answer=student_answer,
+        question_scores=question_scores,
+        question_breakdowns=question_breakdowns
     )
 
-    question_scores[qid] = score
-    question_breakdowns[qid] = breakdown
-    total_score += score
-
-final_score = total_score
-
-print("\n================ FINAL RESULT ================\n")
-
-for qid in question_scores:
-    print(f"{qid} SCORE: {round(question_scores[qid],2)}")
-
-print(f"\nTOTAL SCORE: {round(total_score,2)} / {TOTAL_MARKS}\n")
-
-print("Detailed Breakdown:")
-print(json.dumps(question_breakdowns, indent=2))
-
-
-analysis = run_objective_2(
-    model_answer=model_answer,
-    student_answer=student_answer,
-    question_scores=question_scores,
-    question_breakdowns=question_breakdowns
-)
-
+    print("\n===== AI vs HUMAN ANALYSIS =====\n")
+    for item in analysis:
+        print(f"\n######## {item['question']} ########\n")
+        print(item["analysis"])
 
+    if metrics.is_enabled():
+        json_path, prom_path = metrics.export()
+        print(f"\nMetrics → {json_path}, {prom_path}")
 
-print("\n===== AI vs HUMAN ANALYSIS =====\n")
-for item in analysis:
-    print(f"\n######## {item['question']} ########\n")
-    print(item["analysis"])
 
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,126 @@
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
+
 from embedder import embed
 
+ASSIGNMENT_MODES = ("greedy", "optimal")
+
+# Candidate student components kept per model component in optimal mode
+OPTIMAL_TOP_K = 5
+
+
+def greedy_assignment(sims, threshold):
+    """
+    Greedy matching in model-component order.
+
+    For each model row, take the most similar still-unused student
+    column (first one on ties). It is consumed only if its similarity
+    reaches threshold.
+
+    Returns (assigned, best_sims): assigned[i] is the student index or -1,
+    best_sims[i] the best available similarity (0.0 if none is positive).
+    """
+    m, n = sims.shape
+    available = np.ones(n, dtype=bool)
+    assigned = np.full(m, -1, dtype=np.intp)
+    best_sims = np.zeros(m, dtype=np.float64)
+
+    for i in range(m):
+        row = np.where(available, sims[i], -np.inf)
+        j = int(row.argmax())
+
+        if row[j] > 0.0:
+            best_sims[i] = row[j]
+            if row[j] >= threshold:
+                assigned[i] = j
+                available[j] = False
+
+    return assigned, best_sims
+
+
+def optimal_assignment(sims, weights, threshold, top_k=OPTIMAL_TOP_K):
+    """
+    Max-weight bipartite matching over sims * weights.
+
+    Each model row only keeps its top_k student columns at or above
+    threshold, and the matching is solved directly on that sparse graph
+    (scipy's LAPJVsp), so work grows with the m * top_k candidate edges
+    instead of the dense m × n cubic Hungarian solve.
+
+    Returns (assigned, best_sims) like greedy_assignment.
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+    m, n = sims.shape
+    assigned = np.full(m, -1, dtype=np.intp)
+    k = min(top_k, n)
+
+    # ==============================
+    # TOP-K CANDIDATE EDGES
+    # ==============================
+    cols = np.argpartition(-sims, k - 1, axis=1)[:, :k].ravel()
+    rows = np.repeat(np.arange(m), k)
+    keep = sims[rows, cols] >= threshold
+    rows, cols = rows[keep], cols[keep]
+
+    if rows.size:
+        # ==============================
+        # SPARSE MATCHING
+        # Row i may also take its own dummy column n + i ("unmatched"),
+        # so a full matching always exists. Every row is matched exactly
+        # once, so costs offset - gain (all > 0: sparse zeros are not
+        # edges) minimise to the max-weight matching.
+        # ==============================
+        gain = sims[rows, cols] * weights[rows]
+        offset = float(gain.max()) + 1.0
+
+        graph = csr_matrix(
+            (
+                np.concatenate([offset - gain, np.full(m, offset)]),
+                (np.concatenate([rows, np.arange(m)]), np.concatenate([cols, n + np.arange(m)]))
+            ),
+            shape=(m, n + m)
+        )
+        match = min_weight_full_bipartite_matching(graph)[1]
+
+        real = match < n
+        assigned[real] = match[real]
+
+    # Similarity reported for unmatched rows: best column nobody took
+    available = np.ones(n, dtype=bool)
+    available[assigned[assigned != -1]] = False
+
+    best_sims = np.zeros(m, dtype=np.float64)
+    matched = assigned != -1
+    best_sims[matched] = sims[matched, assigned[matched]]
+
+    if (~matched).any() and available.any():
+        free = np.where(available, sims[~matched], -np.inf).max(axis=1)
+        best_sims[~matched] = np.maximum(free, 0.0)
+
+    return assigned, best_sims
+
 
 def score_student_answer(
     model_components,
     student_components,
     total_marks,
     threshold=0.10,
-    max_penalty=2.0
+    max_penalty=2.0,
+    assignment="greedy",
+    top_k=OPTIMAL_TOP_K,
+    model_embs=None
 ):
+    """
+    assignment="greedy"  → model-component order, first best match wins
+    assignment="optimal" → max-weight matching over similarity * weight,
+                           pruned to each component's top_k candidates
+
+    model_embs may carry precomputed embeddings of model_components
+    (row-aligned) so a model answer shared by many students is embedded once.
+    """
+    if assignment not in ASSIGNMENT_MODES:
+        raise ValueError(f"Unknown assignment '{assignment}', expected one of {ASSIGNMENT_MODES}")
 
     # If no model → nothing to score
     if not model_components:
@@ -41,30 +153,28 @@ def score_student_answer(
     # NORMAL MATCHING
     # ================================
 
-    model_texts = [c["text"] for c in model_components]
-    student_texts = [c["text"] for c in student_components]
+    if model_embs is None:
+        model_embs = embed([c["text"] for c in model_components])
+    student_embs = embed([c["text"] for c in student_components])
 
-    model_embs = embed(model_texts)
-    student_embs = embed(student_texts)
+    # Rows are L2-normalised → one matmul gives the full M×N cosine matrix
+    sims = model_embs @ student_embs.T
+
+    if assignment == "optimal":
+        weights = np.array([c["weight"] for c in model_components], dtype=np.float64)
+        assigned, best_sims = optimal_assignment(sims, weights, threshold, top_k)
+    else:
+        assigned, best_sims = greedy_assignment(sims, threshold)
 
-    used_students = set()
     matched_student_weight = 0.0
 
     for i, m in enumerate(model_components):
-        sims = cosine_similarity([model_embs[i]], student_embs)[0]
-
-        best_j = -1
-        best_sim = 0.0
-
-        for j, sim in enumerate(sims):
-            if j not in used_students and sim > best_sim:
-                best_sim = float(sim)
-                best_j = j
+        best_j = int(assigned[i])
+        best_sim = float(best_sims[i])
 
         earned = 0.0
-        if best_sim >= threshold and best_j != -1:
+        if best_j != -1:
             earned = float(best_sim * m["weight"])
-            used_students.add(best_j)
             matched_student_weight += student_components[best_j]["weight"]
 
         total_score += earned
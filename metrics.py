@@ -0,0 +1,252 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+
+_enabled = os.getenv("MARKMASTER_METRICS", "") not in ("", "0")
+
+
+class Registry:
+    """
+    One set of recorded spans, counters and observations.
+    The process-wide registry is used unless a context installs its own
+    with use() (e.g. one per Streamlit session).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # span name → [calls, total seconds, max seconds]
+        self.spans = defaultdict(lambda: [0, 0.0, 0.0])
+        # counter name → value
+        self.counters = defaultdict(float)
+        # observation name → [count, sum, min, max]
+        self.observations = {}
+
+    def reset(self):
+        with self.lock:
+            self.spans.clear()
+            self.counters.clear()
+            self.observations.clear()
+
+
+_global = Registry()
+_current = contextvars.ContextVar("markmaster_metrics", default=None)
+
+
+def _registry():
+    """
+    Registry to record into, or None when nothing should be recorded.
+    """
+    registry = _current.get()
+    if registry is not None:
+        return registry
+    return _global if _enabled else None
+
+
+# =====================================================
+# ENABLE / RESET
+# =====================================================
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled or _current.get() is not None
+
+
+def use(registry):
+    """
+    Record everything in the current context (this thread, or a task
+    run with contextvars.copy_context()) into `registry` instead of the
+    process-wide registry, whether or not metrics are enabled.
+    """
+    _current.set(registry)
+
+
+def reset():
+    """
+    Start a new run: drop everything recorded so far.
+    """
+    (_current.get() or _global).reset()
+
+
+# =====================================================
+# RECORDING
+# =====================================================
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def record(name, elapsed):
+    """
+    Add one timed call to a span, for code that cannot use `with span()`.
+    """
+    registry = _registry()
+    if registry is None:
+        return
+    with registry.lock:
+        stats = registry.spans[name]
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+
+def span(name):
+    """
+    Time a block: `with metrics.span("embedding"): ...`
+    Disabled → a shared no-op context manager.
+    """
+    if _registry() is None:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def incr(name, value=1):
+    registry = _registry()
+    if registry is None:
+        return
+    with registry.lock:
+        registry.counters[name] += value
+
+
+def observe(name, value):
+    """
+    Record one sample of a distribution (count / sum / min / max kept).
+    """
+    registry = _registry()
+    if registry is None:
+        return
+    with registry.lock:
+        stats = registry.observations.get(name)
+        if stats is None:
+            registry.observations[name] = [1, value, value, value]
+        else:
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = min(stats[2], value)
+            stats[3] = max(stats[3], value)
+
+
+# =====================================================
+# EXPORT
+# =====================================================
+
+def snapshot(registry=None):
+    """
+    Plain-dict copy of `registry` (default: the current context's).
+    """
+    registry = registry or _current.get() or _global
+    with registry.lock:
+        return {
+            "spans": {
+                name: {
+                    "calls": calls,
+                    "total_s": round(total, 6),
+                    "mean_s": round(total / calls, 6) if calls else 0.0,
+                    "max_s": round(peak, 6),
+                }
+                for name, (calls, total, peak) in registry.spans.items()
+            },
+            "counters": {
+                name: int(value) if float(value).is_integer() else value
+                for name, value in registry.counters.items()
+            },
+            "observations": {
+                name: {
+                    "count": count,
+                    "sum": total,
+                    "mean": total / count if count else 0.0,
+                    "min": low,
+                    "max": high,
+                }
+                for name, (count, total, low, high) in registry.observations.items()
+            },
+        }
+
+
+def _metric_name(name):
+    return "markmaster_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def to_prometheus(snap=None):
+    """
+    Prometheus text exposition format of a snapshot.
+    """
+    snap = snap or snapshot()
+    lines = []
+
+    # Samples of one metric family must stay contiguous
+    for metric, field, kind in [
+        ("markmaster_span_seconds_total", "total_s", "counter"),
+        ("markmaster_span_calls_total", "calls", "counter"),
+        ("markmaster_span_max_seconds", "max_s", "gauge"),
+    ]:
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, s in sorted(snap["spans"].items()):
+            lines.append(f'{metric}{{span="{name}"}} {s[field]}')
+
+    for name, value in sorted(snap["counters"].items()):
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+
+    for name, s in sorted(snap["observations"].items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} summary")
+        lines.append(f"{metric}_count {s['count']}")
+        lines.append(f"{metric}_sum {s['sum']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def export(directory="metrics"):
+    """
+    Write the current run as <directory>/run-<timestamp>.json and .prom.
+    Returns both paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"run-{time.strftime('%Y%m%d-%H%M%S')}")
+    snap = snapshot()
+
+    with open(f"{stem}.json", "w", encoding="utf-8") as f:
+        json.dump(snap, f, indent=2)
+    with open(f"{stem}.prom", "w", encoding="utf-8") as f:
+        f.write(to_prometheus(snap))
+
+    return f"{stem}.json", f"{stem}.prom"
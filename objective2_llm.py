@@ -1,12 +1,35 @@
-import os
 import json
-from groq import Groq
-from dotenv import load_dotenv
 
-load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+import metrics
+from disk_cache import DiskCache, make_key, sha256_hex
+from llm_client import complete, provider_name
 
 MODEL_NAME = "meta-llama/llama-4-scout-17b-16e-instruct"
+TEMPERATURE = 0.2
+# Per-call API timeout (seconds)
+MODERATION_TIMEOUT = 90
+
+# Analyses keyed by rendered prompt + model + temperature
+MODERATION_CACHE_MAX_BYTES = 20 * 1024 * 1024
+MODERATION_CACHE_TTL = 7 * 24 * 3600
+
+
+_moderation_cache = None
+
+
+def get_moderation_cache():
+    global _moderation_cache
+    if _moderation_cache is None:
+        _moderation_cache = DiskCache(
+            "moderation",
+            max_bytes=MODERATION_CACHE_MAX_BYTES,
+            ttl=MODERATION_CACHE_TTL
+        )
+    return _moderation_cache
+
+
+def moderation_cache_key(prompt, temperature=TEMPERATURE):
+    return make_key(sha256_hex(prompt), provider_name(), MODEL_NAME, temperature)
 
 
 def compare_ai_with_human(
@@ -15,8 +38,14 @@ def compare_ai_with_human(
     ai_score,
     ai_breakdown,
     human_score,
-    human_feedback
+    human_feedback,
+    use_cache=True
 ):
+    """
+    LLM moderation of AI vs human grading for one question.
+    Identical prompts are answered from the disk cache (within the TTL);
+    use_cache=False forces a fresh analysis, which then replaces the cached one.
+    """
     prompt = f"""
 You are an academic moderation system.
 You are given:
@@ -63,11 +92,29 @@ HUMAN FEEDBACK (JSON):
 
 Return a structured, clear academic analysis.
 """
-    
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2
-    )
-
-    return response.choices[0].message.content
\ No newline at end of file
+
+    cache_key = moderation_cache_key(prompt)
+    if use_cache:
+        cached = get_moderation_cache().get(cache_key)
+        if cached is not None:
+            metrics.incr("moderation.cache_hits")
+            return cached
+        metrics.incr("moderation.cache_misses")
+
+    with metrics.span("moderation"):
+        response = complete(
+            model=MODEL_NAME,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURE,
+            timeout=MODERATION_TIMEOUT
+        )
+
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metrics.incr("llm.tokens", getattr(usage, "total_tokens", 0) or 0)
+
+    analysis = response.choices[0].message.content
+    if analysis:
+        get_moderation_cache().set(cache_key, analysis)
+
+    return analysis
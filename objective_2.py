@@ -1,7 +1,19 @@
+import contextvars
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+from component_builder import MAIN_RATIO
 from objective2_llm import compare_ai_with_human
 
 
+# Prompt budget for EACH answer text of one question (model and student)
+MODERATION_TOKEN_BUDGET = 1500
+# Rough chars per token for English prose
+CHARS_PER_TOKEN = 4
+# Questions moderated at once when run concurrently
+MODERATION_CONCURRENCY = 4
+
+
 def flatten_text(extracted):
     texts = []
 
@@ -29,19 +41,126 @@ def flatten_text(extracted):
     return "\n".join(texts)
 
 
+# =====================================================
+# QUESTION-SCOPED TEXT
+# =====================================================
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def question_lines(extracted, main_ratio=MAIN_RATIO):
+    """
+    flatten_text lines grouped by question, each with its relative weight
+    inside the question (same split as build_weighted_components).
+
+    Returns {qid: [(weight, line), ...]} in reading order.
+    """
+    lines = {}
+    q_index = 0
+
+    for paper in extracted:
+        for q in paper.get("questions", []):
+            q_index += 1
+            # Same fallback id as build_weighted_components → matches score keys
+            qid = q.get("question_id", f"Q{q_index}")
+            parts = q.get("parts", [])
+            out = lines.setdefault(qid, [])
+
+            for part in parts:
+                prefix = f"{qid} ({part.get('part_id', '')}) - "
+                stack = [(part, 1.0 / len(parts))]
+
+                while stack:
+                    node, weight = stack.pop()
+                    subs = node.get("sub_topics", [])
+                    topic = node.get("topic", "")
+                    content = node.get("content", "")
+
+                    if topic or content:
+                        own = weight * main_ratio if subs else weight
+                        out.append((own, f"{prefix}{topic}. {content}".strip()))
+
+                    if subs:
+                        sub_weight = weight * (1 - main_ratio) / len(subs)
+                        stack.extend((s, sub_weight) for s in reversed(subs))
+
+    return lines
+
+
+def budget_text(weighted_lines, max_tokens=MODERATION_TOKEN_BUDGET):
+    """
+    Join lines, dropping the lowest-weight ones until the text fits
+    max_tokens. Kept lines stay in reading order.
+    """
+    total = sum(estimate_tokens(line) for _, line in weighted_lines)
+    if max_tokens is None or total <= max_tokens:
+        return "\n".join(line for _, line in weighted_lines)
+
+    dropped = set()
+    by_weight = sorted(range(len(weighted_lines)), key=lambda i: weighted_lines[i][0])
+    for i in by_weight:
+        if total <= max_tokens:
+            break
+        total -= estimate_tokens(weighted_lines[i][1])
+        dropped.add(i)
+
+    kept = [line for i, (_, line) in enumerate(weighted_lines) if i not in dropped]
+    kept.append(f"[{len(dropped)} low-weight lines omitted]")
+    return "\n".join(kept)
+
+
+def question_texts(extracted, max_tokens=MODERATION_TOKEN_BUDGET):
+    """
+    {qid: text of that question only, within max_tokens}
+    """
+    return {
+        qid: budget_text(lines, max_tokens)
+        for qid, lines in question_lines(extracted).items()
+    }
+
+
+# =====================================================
+# MODERATION
+# =====================================================
+
+def moderate_questions(requests, concurrency=MODERATION_CONCURRENCY):
+    """
+    requests: {qid: compare_ai_with_human keyword arguments}
+    Runs every moderation call concurrently; returns {qid: analysis}.
+    """
+    if not requests:
+        return {}
+
+    workers = max(1, min(int(concurrency), len(requests)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Each call runs in a copy of the caller's context, so its metrics
+        # land in the caller's registry (see metrics.use)
+        futures = {
+            qid: pool.submit(contextvars.copy_context().run, compare_ai_with_human, **kwargs)
+            for qid, kwargs in requests.items()
+        }
+        return {qid: future.result() for qid, future in futures.items()}
 
 
 def run_objective_2(
     model_answer,
     student_answer,
     question_scores,
-    question_breakdowns
+    question_breakdowns,
+    max_tokens=MODERATION_TOKEN_BUDGET,
+    concurrency=MODERATION_CONCURRENCY,
+    use_cache=True
 ):
+    """
+    Collect human scores / feedback for every question, then moderate all
+    questions concurrently. Each call only sees its own question's text.
+    use_cache=False forces fresh analyses instead of cached ones.
+    """
+    model_texts = question_texts(model_answer, max_tokens)
+    student_texts = question_texts(student_answer, max_tokens)
 
-    model_text = flatten_text(model_answer)
-    student_text = flatten_text(student_answer)
-
-    full_analysis = []
+    requests = {}
 
     for qid in question_scores:
 
@@ -58,18 +177,19 @@ def run_objective_2(
                 if fb:
                     human_feedback[item["topic"]] = fb
 
-        analysis = compare_ai_with_human(
-            model_text=model_text,
-            student_text=student_text,
+        requests[qid] = dict(
+            model_text=model_texts.get(qid, ""),
+            student_text=student_texts.get(qid, ""),
             ai_score=question_scores[qid],
             ai_breakdown=question_breakdowns[qid],
             human_score=human_score,
-            human_feedback=human_feedback
+            human_feedback=human_feedback,
+            use_cache=use_cache
         )
 
-        full_analysis.append({
-            "question": qid,
-            "analysis": analysis
-        })
+    analyses = moderate_questions(requests, concurrency)
 
-    return full_analysis
\ No newline at end of file
+    return [
+        {"question": qid, "analysis": analyses[qid]}
+        for qid in question_scores
+    ]
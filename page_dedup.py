@@ -0,0 +1,133 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+
+from disk_cache import sha256_hex
+
+
+# Hash grid: HASH_SIZE × HASH_SIZE gradient bits per page
+HASH_SIZE = 16
+# Near-duplicate (re-photographed) pages are only skipped when asked for:
+# two ruled pages that differ by one short line of writing can be a few
+# bits apart, and a false match silently drops a page from grading.
+# Default None = exact byte copies only. NEAR_DUPLICATE_DISTANCE is the
+# value to opt in with: re-encoded / brighter / slightly rotated copies of
+# the sample pages stay under ~45 bits (of 256).
+DUPLICATE_MAX_DISTANCE = (
+    int(os.environ["MARKMASTER_DUPLICATE_DISTANCE"])
+    if os.getenv("MARKMASTER_DUPLICATE_DISTANCE") else None
+)
+NEAR_DUPLICATE_DISTANCE = 40
+
+# A hash match is confirmed block by block on blurred, contrast-normalised
+# thumbnails: copies of the sample pages stay under ~1.5, one line of new
+# writing on an otherwise identical ruled page scores 4.5+. Pages that
+# differ only by a few characters in the same place still look alike,
+# which is why near duplicates are opt-in.
+CONFIRM_SIZE = 96
+CONFIRM_BLOCK = 8
+CONFIRM_MAX_BLOCK_DIFF = 2.5
+
+
+def page_hash(data, hash_size=HASH_SIZE):
+    """
+    Difference hash of a page image: one bit per horizontal brightness
+    gradient on a (hash_size + 1) × hash_size grayscale thumbnail.
+    Returns a flat boolean array, or None if the image cannot be decoded.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        # JPEG: let the decoder downscale (much faster than full decode)
+        img.draft("L", (hash_size * 8, hash_size * 8))
+        img = ImageOps.exif_transpose(img).convert("L")
+    except OSError:
+        return None
+
+    small = img.resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    return (pixels[:, 1:] > pixels[:, :-1]).ravel()
+
+
+def page_thumbnail(data, size=CONFIRM_SIZE):
+    """
+    Blurred size × size grayscale thumbnail normalised to zero mean and
+    unit variance (brightness / contrast changes cancel out), or None.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.draft("L", (size * 4, size * 4))
+        img = ImageOps.exif_transpose(img).convert("L")
+    except OSError:
+        return None
+
+    img = img.resize((size, size), Image.BILINEAR).filter(ImageFilter.GaussianBlur(1.5))
+    pixels = np.asarray(img, dtype=np.float32)
+    return (pixels - pixels.mean()) / (pixels.std() + 1e-6)
+
+
+def same_page(thumb_a, thumb_b, block=CONFIRM_BLOCK, max_diff=CONFIRM_MAX_BLOCK_DIFF):
+    """
+    True if no block of the two thumbnails differs by more than max_diff
+    (mean absolute difference, in standard deviations).
+    """
+    if thumb_a is None or thumb_b is None:
+        return False
+
+    blocks = thumb_a.shape[0] // block
+    diff = np.abs(thumb_a - thumb_b)[:blocks * block, :blocks * block]
+    return float(diff.reshape(blocks, block, blocks, block).mean(axis=(1, 3)).max()) <= max_diff
+
+
+def find_duplicates(pages_data, max_distance=DUPLICATE_MAX_DISTANCE):
+    """
+    pages_data: raw bytes of each page, in page order.
+
+    Returns {duplicate_index: (original_index, distance)}. The first page of
+    each group is kept; exact byte copies have distance 0. With max_distance,
+    pages within that many hash bits of a kept page are duplicates too if
+    same_page() confirms it.
+    """
+    duplicates = {}
+    seen_bytes = {}
+    kept_hashes = []   # (index, hash) of pages kept so far
+    thumbnails = {}
+
+    def thumbnail(i):
+        if i not in thumbnails:
+            thumbnails[i] = page_thumbnail(pages_data[i])
+        return thumbnails[i]
+
+    for i, data in enumerate(pages_data):
+        digest = sha256_hex(data)
+        if digest in seen_bytes:
+            duplicates[i] = (seen_bytes[digest], 0)
+            continue
+        seen_bytes[digest] = i
+
+        if max_distance is None:
+            continue
+
+        h = page_hash(data)
+        if h is None:
+            continue
+
+        if kept_hashes:
+            indices, matrix = zip(*kept_hashes)
+            distances = np.count_nonzero(np.stack(matrix) != h, axis=1)
+            match = next(
+                (
+                    best for best in np.argsort(distances, kind="stable")
+                    if distances[best] <= max_distance
+                    and same_page(thumbnail(indices[best]), thumbnail(i))
+                ),
+                None
+            )
+            if match is not None:
+                duplicates[i] = (indices[match], int(distances[match]))
+                continue
+
+        kept_hashes.append((i, h))
+
+    return duplicates
@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from component_builder import build_weighted_components
+from embedder import embed
+from grading import score_questions
+from question_groupby import group_by_question
+from scheme import load_or_compile
+from text_extracr import iter_folder
+
+
+def stream_student(student_folder, total_marks, on_page=None, **kwargs):
+    """
+    Extract a student's pages (folder or list of in-memory pages), building and embedding each page's
+    components the moment it arrives while later pages are still in
+    flight. Returns the extracted pages in page order.
+
+    Component text does not depend on weights, so per-page embedding
+    fills the embedding store exactly as the final scoring pass needs it.
+    on_page(index, data) is called as each page finishes (data None if it failed).
+    Other keyword arguments go to iter_folder.
+    """
+    pages = {}
+
+    for index, _, data in iter_folder(student_folder, **kwargs):
+        if on_page:
+            on_page(index, data)
+        if not data:
+            continue
+
+        pages[index] = data
+        page_components = build_weighted_components([data], total_marks)
+        if page_components:
+            embed([c["text"] for c in page_components])
+
+    return [pages[i] for i in sorted(pages)]
+
+
+def grade_folders(model_folder, student_folder, total_marks, assignment="greedy"):
+    """
+    Streaming grading run for one student.
+
+    The marking scheme is loaded/compiled on a background thread while
+    student pages are extracted and embedded as they arrive. Only the
+    final weighting and per-question scoring, which are cheap once
+    everything is embedded, run after the last page lands.
+    So wall-clock time approaches max(network, CPU) rather than their sum.
+    """
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        scheme_future = pool.submit(load_or_compile, model_folder, total_marks)
+        student_answer = stream_student(student_folder, total_marks)
+        scheme = scheme_future.result()
+
+    return score_student(scheme, student_answer, total_marks, assignment)
+
+
+def score_student(scheme, student_answer, total_marks, assignment="greedy"):
+    """
+    Final weighting and per-question scoring of extracted student pages
+    against a compiled scheme. Returns the grading result dict.
+    """
+    # Question weights depend on every page → build final components now
+    student_components = build_weighted_components(student_answer, total_marks)
+    student_by_q = group_by_question(student_components)
+
+    question_scores, question_breakdowns, total_score = score_questions(
+        scheme["model_by_q"],
+        student_by_q,
+        total_marks,
+        model_embs=scheme["model_embs"],
+        assignment=assignment
+    )
+
+    return {
+        "model_answer": scheme["model_answer"],
+        "student_answer": student_answer,
+        "question_scores": question_scores,
+        "question_breakdowns": question_breakdowns,
+        "total_score": total_score,
+    }
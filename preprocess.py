@@ -0,0 +1,124 @@
+import io
+import json
+
+import numpy as np
+from PIL import Image, ImageOps
+
+
+# Default pre-processing applied before extraction; None disables it
+PREPROCESS_OPTIONS = {
+    "max_edge": 1600,       # longest side in pixels after resizing
+    "grayscale": True,
+    "quality": 70,          # JPEG re-encode quality
+    "crop_margins": False,  # trim blank paper around the writing
+    "deskew": False,        # straighten slightly rotated photos
+}
+
+# Deskew search range / step in degrees
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+
+
+def options_signature(options):
+    """
+    Stable string for cache keys: different options → different payload.
+    """
+    return json.dumps(options, sort_keys=True) if options else "raw"
+
+
+def _ink_mask(gray, size=400):
+    """
+    Downscaled boolean mask of "ink" pixels (darker than the page).
+    Returns (mask, scale) where scale maps mask coords back to full size.
+    """
+    small = gray.copy()
+    small.thumbnail((size, size))
+    arr = np.asarray(small, dtype=np.float32)
+
+    # Anything clearly darker than the typical (paper) brightness
+    threshold = np.percentile(arr, 50) - 40
+    return arr < threshold, gray.width / small.width
+
+
+def crop_margins(img, padding=0.02):
+    gray = img.convert("L")
+    mask, scale = _ink_mask(gray)
+
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if rows.size == 0 or cols.size == 0:
+        return img
+
+    pad_x = int(img.width * padding)
+    pad_y = int(img.height * padding)
+    box = (
+        max(0, int(cols[0] * scale) - pad_x),
+        max(0, int(rows[0] * scale) - pad_y),
+        min(img.width, int((cols[-1] + 1) * scale) + pad_x),
+        min(img.height, int((rows[-1] + 1) * scale) + pad_y),
+    )
+    return img.crop(box)
+
+
+def estimate_skew(img):
+    """
+    Angle (degrees) that makes text lines most horizontal: the rotation
+    whose row-wise ink profile has the highest variance.
+    """
+    mask, _ = _ink_mask(img.convert("L"))
+    if not mask.any():
+        return 0.0
+
+    mask_img = Image.fromarray(mask.astype(np.uint8) * 255)
+    best_angle, best_score = 0.0, -1.0
+
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + 1e-9, DESKEW_STEP):
+        rotated = np.asarray(mask_img.rotate(angle, resample=Image.NEAREST), dtype=np.float32)
+        score = float(rotated.sum(axis=1).var())
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+
+    return best_angle
+
+
+def preprocess_image(data, options=PREPROCESS_OPTIONS):
+    """
+    Shrink a page for the vision model.
+    data: raw image bytes (any Pillow-readable format)
+    Returns JPEG bytes, or the original bytes if the image cannot be
+    decoded or processing would not make the payload smaller.
+    """
+    if not options:
+        return data
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        # Phone photos are often stored sideways with an EXIF rotation flag
+        img = ImageOps.exif_transpose(img)
+    except OSError:
+        # Let the API report unreadable pages as before
+        return bytes(data)
+
+    if options.get("grayscale"):
+        img = img.convert("L")
+    elif img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    if options.get("deskew"):
+        angle = estimate_skew(img)
+        if angle:
+            fill = 255 if img.mode == "L" else (255, 255, 255)
+            img = img.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+    if options.get("crop_margins"):
+        img = crop_margins(img)
+
+    max_edge = options.get("max_edge")
+    if max_edge and max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=options.get("quality", 70), optimize=True)
+    processed = out.getvalue()
+
+    return processed if len(processed) < len(data) else bytes(data)
@@ -0,0 +1,52 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate_per_minute`.
+    acquire() blocks until enough tokens are available.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = float(rate_per_minute) / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        # Requests larger than the bucket would never fit → clamp to capacity
+        amount = min(float(amount), self.capacity)
+
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """
+    Combined requests-per-minute and tokens-per-minute limit.
+    Either limit may be None to disable it.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens=0):
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens and tokens:
+            self.tokens.acquire(tokens)
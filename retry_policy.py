@@ -0,0 +1,187 @@
+import email.utils
+import random
+import threading
+import time
+
+import metrics
+
+
+# Defaults for extraction calls
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 1.0      # seconds, doubled every attempt
+RETRY_MAX_DELAY = 30.0      # cap for one backoff / Retry-After wait
+RETRY_MAX_ELAPSED = 180.0   # give a page up after this long in total
+
+# Circuit breaker: consecutive API failures before the queue pauses
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+
+
+# =====================================================
+# ERROR CLASSIFICATION
+# =====================================================
+
+def status_code(exc):
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code
+
+
+def retry_after(exc):
+    """
+    Seconds the server asked us to wait (Retry-After / retry-after-ms
+    header of a 429 / 503), or None.
+    """
+    if getattr(exc, "retry_after", None) is not None:
+        return float(exc.retry_after)
+
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    # HTTP date; a malformed header counts as no hint
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def is_retryable(exc):
+    """
+    Timeouts, connection errors, 408 / 409 / 429 and 5xx are worth
+    retrying; other 4xx (bad request, auth …) will fail the same way again.
+    """
+    code = status_code(exc)
+    if code is None:
+        return True
+    return code in (408, 409, 429) or code >= 500
+
+
+# =====================================================
+# BACKOFF
+# =====================================================
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, bounded per attempt (max_delay)
+    and per page (max_elapsed). A server Retry-After overrides the backoff.
+    """
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY,
+                 max_delay=RETRY_MAX_DELAY, max_elapsed=RETRY_MAX_ELAPSED, seed=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, attempt, exc=None):
+        """
+        Seconds to wait before attempt + 1.
+        """
+        server = retry_after(exc) if exc is not None else None
+        if server is not None:
+            return min(server, self.max_delay)
+
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        with self._lock:
+            return self._rng.uniform(0, ceiling)
+
+    def should_retry(self, attempt, exc, elapsed, delay):
+        return (
+            attempt < self.max_attempts
+            and is_retryable(exc)
+            and (self.max_elapsed is None or elapsed + delay <= self.max_elapsed)
+        )
+
+
+# =====================================================
+# CIRCUIT BREAKER
+# =====================================================
+
+class CircuitBreaker:
+    """
+    Shared by every worker of one extraction queue.
+
+    closed    → calls go through; consecutive failures are counted
+    open      → after failure_threshold failures every worker waits in
+                wait() for reset_timeout (the whole queue pauses)
+    half-open → one worker probes the API; success closes the breaker,
+                failure re-opens it
+
+    pause(seconds) holds the queue without counting a failure
+    (used for a 429's Retry-After).
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.open_until = 0.0
+        self.probe_started = None
+        self._cond = threading.Condition()
+
+    def wait(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+
+                if now < self.open_until:
+                    self._cond.wait(self.open_until - now)
+                    continue
+
+                if self.state == "closed":
+                    return
+
+                # Half-open: let one probe through (or a new one if it stalled)
+                if self.probe_started is None or now - self.probe_started > self.reset_timeout:
+                    self.probe_started = now
+                    return
+
+                self._cond.wait(self.reset_timeout)
+
+    def pause(self, seconds):
+        with self._cond:
+            self.open_until = max(self.open_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def record_success(self):
+        with self._cond:
+            self.failures = 0
+            self.state = "closed"
+            self.probe_started = None
+            self._cond.notify_all()
+
+    def record_failure(self):
+        with self._cond:
+            self.failures += 1
+
+            if self.state == "open" or self.failures >= self.failure_threshold:
+                if self.state != "open" or self.probe_started is not None:
+                    metrics.incr("extraction.breaker_open")
+                    print(f"⛔ Circuit open: pausing extraction for {self.reset_timeout:.0f}s")
+                self.state = "open"
+                self.open_until = time.monotonic() + self.reset_timeout
+                self.probe_started = None
+
+            self._cond.notify_all()
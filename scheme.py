@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import embedder
+import metrics
+import text_extracr
+from component_builder import MAIN_RATIO, build_weighted_components
+from disk_cache import CACHE_DIR, make_key, sha256_hex
+from grading import embed_model_questions
+from llm_client import provider_name
+from preprocess import options_signature
+from question_groupby import group_by_question
+
+
+# Bump when the artifact layout changes
+SCHEME_VERSION = 1
+SCHEME_DIR = os.path.join(CACHE_DIR, "schemes")
+
+
+def folder_hash(folder_path):
+    """
+    Content hash of every page in the folder, or of a list of
+    in-memory page sources (names ignored).
+    """
+    return make_key(*[
+        sha256_hex(text_extracr.read_image(page))
+        for page in text_extracr.resolve_pages(folder_path)
+    ])
+
+
+def scheme_fingerprint(source_hash, total_marks, main_ratio=MAIN_RATIO):
+    """
+    Everything that changes the compiled scheme. A stored artifact is
+    only reused when its fingerprint matches exactly.
+    """
+    return {
+        "version": SCHEME_VERSION,
+        "source": source_hash,
+        "total_marks": float(total_marks),
+        "main_ratio": float(main_ratio),
+        "extraction_model": text_extracr.MODEL_NAME,
+        "llm_provider": provider_name(),
+        "extraction_prompt": sha256_hex(text_extracr.EXTRACTION_PROMPT),
+        "preprocess": options_signature(text_extracr.PREPROCESS_OPTIONS),
+        "duplicate_distance": text_extracr.DUPLICATE_MAX_DISTANCE,
+        "batch_pages": text_extracr.BATCH_PAGES,
+        "embedding_model": embedder.MODEL_NAME,
+        "embedding_backend": embedder.EMBED_BACKEND,
+    }
+
+
+def compile_scheme(model_answer, total_marks, source_hash, main_ratio=MAIN_RATIO):
+    """
+    Build components, question grouping and embeddings for a model answer.
+
+    Returns a scheme dict:
+        fingerprint, model_answer, model_by_q, model_embs {qid: matrix}
+    """
+    model_components = build_weighted_components(model_answer, total_marks, main_ratio)
+    model_by_q = group_by_question(model_components)
+
+    return {
+        "fingerprint": scheme_fingerprint(source_hash, total_marks, main_ratio),
+        "model_answer": model_answer,
+        "model_by_q": model_by_q,
+        "model_embs": {
+            qid: _stored_precision(matrix)
+            for qid, matrix in embed_model_questions(model_by_q).items()
+        },
+    }
+
+
+# =====================================================
+# ON-DISK FORMAT (.npz)
+#   meta        uint8 JSON: fingerprint, model_answer, model_by_q, qids
+#   embeddings  float16 (total components, dim), questions concatenated
+#   offsets     int64 row offset of each question (len(qids) + 1)
+# =====================================================
+
+def _stored_precision(embeddings):
+    """
+    Unit rows rounded to the float16 precision of the artifact (and back
+    to float32), so a freshly compiled scheme scores exactly like a
+    loaded one. Rounding a stored row again leaves it unchanged.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    return np.ascontiguousarray(embeddings.astype(np.float16).astype(np.float32))
+
+
+def save_scheme(scheme, path):
+    qids = list(scheme["model_by_q"])
+    matrices = [scheme["model_embs"][q] for q in qids]
+
+    offsets = np.cumsum([0] + [m.shape[0] for m in matrices]).astype(np.int64)
+    dim = matrices[0].shape[1] if matrices else 0
+    embeddings = (np.concatenate(matrices) if matrices else np.empty((0, dim))).astype(np.float16)
+
+    meta = json.dumps({
+        "fingerprint": scheme["fingerprint"],
+        "model_answer": scheme["model_answer"],
+        # dict() handles both Component records and loaded dicts
+        "model_by_q": {q: [dict(c) for c in comps] for q, comps in scheme["model_by_q"].items()},
+        "qids": qids,
+    }).encode()
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(
+        tmp_path,
+        meta=np.frombuffer(meta, dtype=np.uint8),
+        embeddings=embeddings,
+        offsets=offsets
+    )
+    os.replace(tmp_path, path)
+
+
+def load_scheme(path, fingerprint=None):
+    """
+    Load an artifact. Returns None if it is missing, unreadable or its
+    fingerprint differs from the expected one.
+    """
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes())
+            embeddings = data["embeddings"].astype(np.float32)
+            offsets = data["offsets"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+    if fingerprint is not None and meta["fingerprint"] != fingerprint:
+        return None
+
+    model_embs = {
+        qid: np.ascontiguousarray(embeddings[offsets[i]:offsets[i + 1]])
+        for i, qid in enumerate(meta["qids"])
+    }
+
+    return {
+        "fingerprint": meta["fingerprint"],
+        "model_answer": meta["model_answer"],
+        "model_by_q": meta["model_by_q"],
+        "model_embs": model_embs,
+    }
+
+
+def scheme_path(source_hash):
+    return os.path.join(SCHEME_DIR, f"{source_hash}.npz")
+
+
+def load_or_compile(model_folder, total_marks, main_ratio=MAIN_RATIO):
+    """
+    Return the compiled scheme for a model-answer folder (or list of
+    in-memory pages), reusing the stored artifact when the pages, marks,
+    ratio and models are unchanged.
+    """
+    source_hash = folder_hash(model_folder)
+    fingerprint = scheme_fingerprint(source_hash, total_marks, main_ratio)
+    path = scheme_path(source_hash)
+
+    with metrics.span("scheme.load"):
+        scheme = load_scheme(path, fingerprint)
+    if scheme is not None:
+        metrics.incr("scheme.cache_hits")
+        return scheme
+
+    metrics.incr("scheme.cache_misses")
+    model_answer = text_extracr.process_folder(model_folder)
+    with metrics.span("scheme.compile"):
+        scheme = compile_scheme(model_answer, total_marks, source_hash, main_ratio)
+
+    # Failed extraction should not be pinned as the scheme for these pages
+    if scheme["model_by_q"]:
+        save_scheme(scheme, path)
+
+    return scheme
+
+
+# =====================================================
+# CLI
+# =====================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile / inspect marking schemes")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("compile", help="compile a model-answer folder")
+    p.add_argument("model_folder")
+    p.add_argument("--total-marks", type=float, default=20)
+    p.add_argument("--main-ratio", type=float, default=MAIN_RATIO)
+
+    p = sub.add_parser("info", help="show an artifact's fingerprint and questions")
+    p.add_argument("path")
+
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        scheme = load_or_compile(args.model_folder, args.total_marks, args.main_ratio)
+        if not scheme["model_by_q"]:
+            print("❌ No questions extracted from the model answer")
+            return
+
+        path = scheme_path(scheme["fingerprint"]["source"])
+        print(f"Scheme → {path}")
+
+        start = time.perf_counter()
+        load_scheme(path)
+        print(f"Load time: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    elif args.command == "info":
+        scheme = load_scheme(args.path)
+        if scheme is None:
+            print("Not a readable scheme artifact")
+            return
+
+        print(json.dumps(scheme["fingerprint"], indent=2))
+        for qid, components in scheme["model_by_q"].items():
+            print(f"{qid}: {len(components)} components")
+
+
+if __name__ == "__main__":
+    main()
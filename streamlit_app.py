@@ -1,23 +1,53 @@
 import streamlit as st
 import json
 import os
+import subprocess
+import sys
+import time
 
-from text_extracr import process_folder
+import metrics
 from component_builder import build_weighted_components
-from matcher import score_student_answer
-from objective_2 import flatten_text
+from grading import score_questions
+from job_queue import JobQueue, spool_uploads
+from objective_2 import moderate_questions, question_texts
 from objective2_llm import compare_ai_with_human
 from question_groupby import group_by_question
+from scheme import folder_hash
 
 # NEW
-from upload_pics import prepare_upload_folder, clear_temp_folder, folder_has_images
+from upload_pics import folder_has_images, uploads_hash
 
 
 # ---------------- CONFIG ----------------
 DEFAULT_MODEL_FOLDER = "model_answer"
 DEFAULT_STUDENT_FOLDER = "student_answer"
 
+# Worker processes started by the app when none are running
+WORKER_PROCESSES = int(os.getenv("MARKMASTER_WORKERS", "2"))
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+JOB_POLL_INTERVAL = 1.0
+JOB_STAGE_LABELS = {
+    "queued": "Compiling marking scheme...",
+    "scheme": "Extracting student pages...",
+    "extract": "Scoring...",
+    "score": "Scoring...",
+}
+
 st.set_page_config(page_title="MarkMaster", layout="wide")
+
+
+def use_session_metrics():
+    """
+    Record this script / fragment run into the session's own registry,
+    so concurrent sessions do not add to each other's counters.
+    """
+    if "session_metrics" not in st.session_state:
+        st.session_state.session_metrics = metrics.Registry()
+    metrics.use(st.session_state.session_metrics)
+
+
+use_session_metrics()
+_page_start = time.perf_counter()
 st.title("📘 MarkMaster – AI Assisted Grading")
 
 
@@ -30,13 +60,71 @@ for key in [
     "model_answer",
     "student_answer",
     "analysis_results",
-    "temp_model_folder",
-    "temp_student_folder"
+    "run_metrics",
+    "model_hash",
+    "student_hash",
+    "scored_marks",
+    "duplicate_pages",
+    "job_id",
+    "loaded_job",
+    "failed_pages"
 ]:
     if key not in st.session_state:
         st.session_state[key] = None
 
 
+# =====================================================
+# CACHES — keyed by upload content hashes
+# (underscore args are not hashed by Streamlit)
+# =====================================================
+
+@st.cache_resource(show_spinner=False)
+def get_queue():
+    return JobQueue()
+
+
+def ensure_workers():
+    """
+    Start worker.py in the background unless a worker is already alive.
+    The workers outlive the app, so running jobs survive a restart.
+    """
+    if get_queue().active_workers():
+        return
+
+    process = subprocess.Popen(
+        [sys.executable, WORKER_SCRIPT, "--workers", str(WORKER_PROCESSES)],
+        start_new_session=True
+    )
+    # Count the launch as a live worker until its processes report in,
+    # so reruns in the meantime do not start a second pool
+    get_queue().heartbeat(worker_id=f"launcher-{process.pid}")
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def rescore_cached(model_hash, student_hash, total_marks, _model_answer, _student_answer):
+    """
+    Only the marks changed: re-weight and re-score the answers already
+    extracted. No OCR, and embeddings come straight from the store.
+    """
+    model_by_q = group_by_question(build_weighted_components(_model_answer, total_marks))
+    student_by_q = group_by_question(build_weighted_components(_student_answer, total_marks))
+
+    question_scores, question_breakdowns, total_score = score_questions(
+        model_by_q, student_by_q, total_marks
+    )
+
+    return {
+        "question_scores": question_scores,
+        "question_breakdowns": question_breakdowns,
+        "total_score": total_score,
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def question_texts_cached(content_hash, _answer):
+    return question_texts(_answer)
+
+
 # =====================================================
 # OBJECTIVE 1 — INPUT SOURCE
 # =====================================================
@@ -82,28 +170,12 @@ TOTAL_MARKS = st.number_input(
 
 if st.button("🚀 Start Processing", use_container_width=True):
 
-    with st.spinner("Preparing files..."):
-
-        # ---------- MODEL SOURCE ----------
-        if model_uploads:
-            model_folder = prepare_upload_folder(model_uploads, "model_")
-            st.session_state.temp_model_folder = model_folder
-        else:
-            model_folder = DEFAULT_MODEL_FOLDER
-
-        # ---------- STUDENT SOURCE ----------
-        if student_uploads:
-            student_folder = prepare_upload_folder(student_uploads, "student_")
-            st.session_state.temp_student_folder = student_folder
-        else:
-            student_folder = DEFAULT_STUDENT_FOLDER
-
     # =====================================================
     # ✅ VALIDATION LOGIC (NEW)
     # =====================================================
 
-    model_exists = folder_has_images(model_folder)
-    student_exists = folder_has_images(student_folder)
+    model_exists = bool(model_uploads) or folder_has_images(DEFAULT_MODEL_FOLDER)
+    student_exists = bool(student_uploads) or folder_has_images(DEFAULT_STUDENT_FOLDER)
 
     if not model_exists and not student_exists:
         st.error("❌ No model or student answer images found.")
@@ -124,46 +196,224 @@ if st.button("🚀 Start Processing", use_container_width=True):
     # SAFE TO PROCESS
     # =====================================================
 
-    with st.spinner("Processing and grading..."):
+    # Uploads are spooled to disk (once per content) so the worker
+    # processes can read them; default folders are read in place
+    with st.spinner("Preparing files..."):
 
-        model_answer = process_folder(model_folder)
-        student_answer = process_folder(student_folder)
+        # ---------- MODEL SOURCE ----------
+        if model_uploads:
+            model_hash = uploads_hash(model_uploads)
+            model_source = spool_uploads(model_uploads, model_hash)
+        else:
+            model_source = DEFAULT_MODEL_FOLDER
+            model_hash = folder_hash(model_source)
 
-        model_components = build_weighted_components(model_answer, TOTAL_MARKS)
-        student_components = build_weighted_components(student_answer, TOTAL_MARKS)
+        # ---------- STUDENT SOURCE ----------
+        if student_uploads:
+            student_hash = uploads_hash(student_uploads)
+            student_source = spool_uploads(student_uploads, student_hash)
+        else:
+            student_source = DEFAULT_STUDENT_FOLDER
+            student_hash = folder_hash(student_source)
+
+    ensure_workers()
+    job_id = get_queue().submit(
+        model_source, student_source, TOTAL_MARKS,
+        model_hash=model_hash, student_hash=student_hash
+    )
 
-        model_by_q = group_by_question(model_components)
-        student_by_q = group_by_question(student_components)
+    # In the URL too, so a page refresh picks the job up again
+    st.session_state.job_id = job_id
+    st.query_params["job"] = job_id
+    st.session_state.processed = False
 
-        question_scores = {}
-        question_breakdowns = {}
 
-        total_score = 0
-        per_question_marks = TOTAL_MARKS / len(model_by_q)
+# =====================================================
+# JOB PROGRESS — grading runs in worker.py processes;
+# the app only polls the job queue
+# =====================================================
 
-        for qid in model_by_q:
+if st.session_state.job_id is None and "job" in st.query_params:
+    st.session_state.job_id = st.query_params["job"]
 
-            score, breakdown = score_student_answer(
-                model_by_q[qid],
-                student_by_q.get(qid, []),
-                total_marks=per_question_marks
-            )
 
-            question_scores[qid] = score
-            question_breakdowns[qid] = breakdown
-            total_score += score
+def load_job_result(job):
+    params = job["params"]
+    result = job["result"]
+
+    st.session_state.model_answer = result["model_answer"]
+    st.session_state.student_answer = result["student_answer"]
+    st.session_state.question_scores = result["question_scores"]
+    st.session_state.question_breakdowns = result["question_breakdowns"]
+    st.session_state.total_score = result["total_score"]
+    st.session_state.model_hash = params["model_hash"]
+    st.session_state.student_hash = params["student_hash"]
+    st.session_state.scored_marks = params["total_marks"]
+    st.session_state.duplicate_pages = result.get("duplicate_pages")
+    st.session_state.failed_pages = result.get("failed_pages")
+    st.session_state.processed = True
+    st.session_state.loaded_job = job["id"]
+    st.session_state.analysis_results = {}
+    st.session_state.run_metrics = result.get("metrics")
+
 
-        st.session_state.model_answer = model_answer
-        st.session_state.student_answer = student_answer
-        st.session_state.question_scores = question_scores
-        st.session_state.question_breakdowns = question_breakdowns
-        st.session_state.total_score = total_score
-        st.session_state.processed = True
-        st.session_state.analysis_results = {}
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def job_progress(job_id):
+    """
+    Polls the queue every JOB_POLL_INTERVAL seconds; only this fragment
+    reruns until the job finishes.
+    """
+    job = get_queue().get(job_id)
 
-        clear_temp_folder(st.session_state.temp_model_folder)
-        clear_temp_folder(st.session_state.temp_student_folder)
+    # Finished, or removed from the queue meanwhile → full page rerun
+    if job is None or job["status"] in ("done", "partial", "failed"):
+        st.rerun()
 
+    label = JOB_STAGE_LABELS.get(job["stage"], job["stage"])
+    if job["status"] == "queued":
+        label = "Waiting for a worker..."
+
+    done, total = job["pages_done"], job["pages_total"]
+    st.progress(done / total if total else 0.0, text=f"{label} ({done}/{total} student pages)")
+
+    if job["status"] == "queued" and not get_queue().active_workers():
+        st.warning("No grading worker is running. Start one with `python worker.py`.")
+
+
+job_id = st.session_state.job_id
+if job_id and st.session_state.loaded_job != job_id:
+    job = get_queue().get(job_id)
+
+    if job is None:
+        st.session_state.job_id = None
+        st.query_params.pop("job", None)
+
+    elif job["status"] in ("done", "partial"):
+        load_job_result(job)
+
+    elif job["status"] == "failed":
+        st.error(f"❌ Grading failed: {job['error']}")
+        if st.button("🔁 Retry job", key="retry_job"):
+            get_queue().retry(job_id)
+            ensure_workers()
+            st.rerun()
+
+    else:
+        job_progress(job_id)
+
+
+# =====================================================
+# TOTAL MARKS CHANGED → RESCORE WITHOUT OCR
+# =====================================================
+
+if st.session_state.processed and st.session_state.scored_marks != TOTAL_MARKS:
+
+    with st.spinner("Rescaling scores..."):
+        rescored = rescore_cached(
+            st.session_state.model_hash,
+            st.session_state.student_hash,
+            TOTAL_MARKS,
+            st.session_state.model_answer,
+            st.session_state.student_answer
+        )
+
+    st.session_state.question_scores = rescored["question_scores"]
+    st.session_state.question_breakdowns = rescored["question_breakdowns"]
+    st.session_state.total_score = rescored["total_score"]
+    st.session_state.scored_marks = TOTAL_MARKS
+    st.session_state.analysis_results = {}
+
+
+# =====================================================
+# FRAGMENTS — interacting with one question reruns only its own
+# fragment, not the whole page
+# =====================================================
+
+@st.fragment
+def breakdown_viewer(qid):
+    use_session_metrics()
+    start = time.perf_counter()
+
+    if st.button(f"Show Breakdown — {qid}", key=f"break_{qid}"):
+        st.json(st.session_state.question_breakdowns[qid])
+
+    metrics.record("ui.fragment.breakdown", time.perf_counter() - start)
+
+
+def moderation_request(qid, model_text, student_text):
+    """
+    compare_ai_with_human arguments for one question, read from the
+    moderation panel's widgets in session state.
+    """
+    human_feedback = {}
+    for idx, item in enumerate(st.session_state.question_breakdowns[qid]):
+        if "topic" in item:
+            fb = st.session_state.get(f"fb_area_{qid}_{item['topic']}_{idx}") or ""
+            if fb.strip():
+                human_feedback[item["topic"]] = fb.strip()
+
+    return dict(
+        model_text=model_text,
+        student_text=student_text,
+        ai_score=st.session_state.question_scores[qid],
+        ai_breakdown=st.session_state.question_breakdowns[qid],
+        human_score=st.session_state.get(f"human_score_input_{qid}") or 0.0,
+        human_feedback=human_feedback if human_feedback else None,
+        use_cache=not st.session_state.get("force_reanalysis")
+    )
+
+
+@st.fragment
+def moderation_panel(qid, model_text, student_text):
+    use_session_metrics()
+    start = time.perf_counter()
+
+    ai_score_q = st.session_state.question_scores[qid]
+    breakdown_q = st.session_state.question_breakdowns[qid]
+
+    with st.expander(f"Moderation Panel — {qid}"):
+
+        st.write(f"**AI Score:** {round(ai_score_q, 2)}")
+
+        st.number_input(
+            f"Human score for Question {qid}",
+            min_value=0.0,
+            max_value=100.0,
+            step=0.5,
+            key=f"human_score_input_{qid}" # Unique Key 1
+        )
+
+        st.write("### Topic Feedback")
+
+        # FIXED LOOP: Added enumerate for a perfectly unique key
+        for idx, item in enumerate(breakdown_q):
+            if "topic" in item:
+                topic_name = item['topic']
+                
+                # We combine QID, Topic Name, and Index to ensure NO key collision
+                st.text_area(
+                    label=f"Feedback for Topic: {topic_name}",
+                    key=f"fb_area_{qid}_{topic_name}_{idx}" # Unique Key 2
+                )
+
+        if st.button(f"Run Analysis — {qid}", key=f"btn_analyze_{qid}"): # Unique Key 3
+
+            with st.spinner(f"Analyzing {qid}..."):
+                analysis = compare_ai_with_human(
+                    **moderation_request(qid, model_text, student_text)
+                )
+
+                st.session_state.analysis_results[qid] = analysis
+                st.session_state.run_metrics = metrics.snapshot()
+                st.success(f"Analysis for {qid} complete!")
+
+        # Display the result if it exists in state
+        if qid in st.session_state.analysis_results:
+            st.markdown("---")
+            st.markdown("### 📝 Analysis Result")
+            st.info(st.session_state.analysis_results[qid])
+
+    metrics.record("ui.fragment.moderation", time.perf_counter() - start)
 
 
 # =====================================================
@@ -176,6 +426,22 @@ if st.session_state.processed:
         f"✅ TOTAL AI SCORE: {round(st.session_state.total_score,2)} / {TOTAL_MARKS}"
     )
 
+    for label, skipped in (st.session_state.duplicate_pages or {}).items():
+        if skipped:
+            st.warning(f"⏭️ {label} duplicate pages skipped: {', '.join(skipped)}")
+
+    if st.session_state.failed_pages:
+        st.error(
+            f"⚠️ {len(st.session_state.failed_pages)} student page(s) could not be "
+            f"extracted and are NOT graded: {', '.join(st.session_state.failed_pages)}"
+        )
+        if st.button("🔁 Retry failed pages", key="retry_failed_pages"):
+            get_queue().retry(st.session_state.job_id)
+            ensure_workers()
+            st.session_state.loaded_job = None
+            st.session_state.processed = False
+            st.rerun()
+
     st.subheader("📊 Question-wise Scores")
 
     for qid, score in st.session_state.question_scores.items():
@@ -185,8 +451,35 @@ if st.session_state.processed:
     st.subheader("📑 Question Breakdown")
 
     for qid in st.session_state.question_breakdowns:
-        if st.button(f"Show Breakdown — {qid}", key=f"break_{qid}"):
-            st.json(st.session_state.question_breakdowns[qid])
+        breakdown_viewer(qid)
+
+    # ---------------- TIMING PANEL ----------------
+    if st.session_state.run_metrics:
+        snap = st.session_state.run_metrics
+
+        with st.expander("⏱ Timing"):
+            st.table([
+                {
+                    "stage": name,
+                    "calls": s["calls"],
+                    "total (s)": round(s["total_s"], 3),
+                    "mean (ms)": round(s["mean_s"] * 1000, 1),
+                    "max (ms)": round(s["max_s"] * 1000, 1),
+                }
+                for name, s in sorted(snap["spans"].items())
+            ])
+            st.write("**Counters**")
+            st.json(snap["counters"])
+
+            c1, c2 = st.columns(2)
+            c1.download_button(
+                "Download JSON", json.dumps(snap, indent=2),
+                file_name="markmaster_metrics.json"
+            )
+            c2.download_button(
+                "Download Prometheus", metrics.to_prometheus(snap),
+                file_name="markmaster_metrics.prom"
+            )
 
 
 # =====================================================
@@ -198,61 +491,27 @@ if st.session_state.processed:
     st.divider()
     st.header("Objective 2: Human vs AI Moderation")
 
-    model_text = flatten_text(st.session_state.model_answer)
-    student_text = flatten_text(st.session_state.student_answer)
+    # Each question is moderated against its own slice of both answers
+    model_texts = question_texts_cached(st.session_state.model_hash, st.session_state.model_answer)
+    student_texts = question_texts_cached(st.session_state.student_hash, st.session_state.student_answer)
+
+    st.checkbox(
+        "Force re-analysis (ignore cached analyses)",
+        key="force_reanalysis"
+    )
 
     # We iterate through the questions
     for qid in st.session_state.question_scores:
+        moderation_panel(qid, model_texts.get(qid, ""), student_texts.get(qid, ""))
 
-        ai_score_q = st.session_state.question_scores[qid]
-        breakdown_q = st.session_state.question_breakdowns[qid]
-
-        with st.expander(f"Moderation Panel — {qid}"):
+    if st.button("Run Analysis — all questions", key="btn_analyze_all"):
+        with st.spinner("Analyzing all questions..."):
+            st.session_state.analysis_results.update(moderate_questions({
+                qid: moderation_request(qid, model_texts.get(qid, ""), student_texts.get(qid, ""))
+                for qid in st.session_state.question_scores
+            }))
+            st.session_state.run_metrics = metrics.snapshot()
+        st.rerun()
 
-            st.write(f"**AI Score:** {round(ai_score_q, 2)}")
-
-            human_score = st.number_input(
-                f"Human score for Question {qid}",
-                min_value=0.0,
-                max_value=100.0,
-                step=0.5,
-                key=f"human_score_input_{qid}" # Unique Key 1
-            )
 
-            st.write("### Topic Feedback")
-            human_feedback = {}
-
-            # FIXED LOOP: Added enumerate for a perfectly unique key
-            for idx, item in enumerate(breakdown_q):
-                if "topic" in item:
-                    topic_name = item['topic']
-                    
-                    # We combine QID, Topic Name, and Index to ensure NO key collision
-                    fb = st.text_area(
-                        label=f"Feedback for Topic: {topic_name}",
-                        key=f"fb_area_{qid}_{topic_name}_{idx}" # Unique Key 2
-                    )
-                    
-                    if fb.strip():
-                        human_feedback[topic_name] = fb.strip()
-
-            if st.button(f"Run Analysis — {qid}", key=f"btn_analyze_{qid}"): # Unique Key 3
-
-                with st.spinner(f"Analyzing {qid}..."):
-                    analysis = compare_ai_with_human(
-                        model_text=model_text,
-                        student_text=student_text,
-                        ai_score=ai_score_q,
-                        ai_breakdown=breakdown_q,
-                        human_score=human_score,
-                        human_feedback=human_feedback if human_feedback else None
-                    )
-
-                    st.session_state.analysis_results[qid] = analysis
-                    st.success(f"Analysis for {qid} complete!")
-
-            # Display the result if it exists in state
-            if qid in st.session_state.analysis_results:
-                st.markdown("---")
-                st.markdown("### 📝 Analysis Result")
-                st.info(st.session_state.analysis_results[qid])
\ No newline at end of file
+metrics.record("ui.page_rerun", time.perf_counter() - _page_start)
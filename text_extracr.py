@@ -2,28 +2,60 @@ import os
 import base64
 import json
 import glob
+import multiprocessing
+import re
+import threading
 import time
-from dotenv import load_dotenv
-from groq import Groq
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
-load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+import metrics
+from disk_cache import DiskCache, make_key, sha256_hex
+from llm_client import complete, provider_name
+from page_dedup import DUPLICATE_MAX_DISTANCE, find_duplicates
+from preprocess import PREPROCESS_OPTIONS, options_signature, preprocess_image
+from rate_limit import RateLimiter
+from retry_policy import (
+    RETRY_BASE_DELAY,
+    RETRY_MAX_ATTEMPTS,
+    CircuitBreaker,
+    RetryPolicy,
+    is_retryable,
+    retry_after,
+)
 
 MODEL_NAME = "meta-llama/llama-4-scout-17b-16e-instruct"
 
+# Concurrency / rate limits for process_folder. The limits are the API
+# key's; every extraction in a process shares one limiter, and processes
+# sharing the key (worker.py sets this) each take an equal share
+MAX_CONCURRENCY = 4
+REQUESTS_PER_MINUTE = 30
+TOKENS_PER_MINUTE = 30000
+EXTRACTION_PROCESSES = max(1, int(os.getenv("MARKMASTER_EXTRACTION_PROCESSES", "1")))
 
-def encode_image(image_path):
-    with open(image_path, "rb") as f:
-        return base64.b64encode(f.read()).decode()
+# iter_pages default for requests / tokens per minute: the process-wide limiter
+SHARED_LIMIT = "shared"
 
+# Rough per-request token cost used by the tokens-per-minute bucket
+IMAGE_TOKEN_ESTIMATE = 1500
+RESPONSE_TOKEN_ESTIMATE = 1000
 
-def extract_content_from_image(image_path, max_retries=3, retry_delay=2):
-    """
-    Extract full answer sheet structure:
-    Questions -> Parts -> Topics -> Subtopics
-    """
+# Per-call API timeout (seconds)
+EXTRACTION_TIMEOUT = 60
+
+# Multi-page requests: pages per call by default (1 = one request per page),
+# and the most images / payload bytes one call may carry
+BATCH_PAGES = int(os.getenv("MARKMASTER_BATCH_PAGES", "1"))
+BATCH_MAX_IMAGES = 4
+BATCH_MAX_BYTES = 3 * 1024 * 1024   # ≈ 4 MB once base64 encoded
+
+# Pages pre-processed in worker processes while others are on the network
+PREPROCESS_WORKERS = 2
 
-    prompt = """
+# Extracted JSON keyed by image bytes + model + prompt + pre-processing
+EXTRACTION_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+EXTRACTION_PROMPT = """
 Extract handwritten answers into STRICT JSON.
 
 The paper may contain:
@@ -64,25 +96,357 @@ CRITICAL RULES:
 - Return valid JSON only
 """
 
+BATCH_PROMPT_SUFFIX = """
+The {pages} images are CONSECUTIVE PAGES of ONE answer script, in order.
+- Return ONE JSON object covering all pages
+- An answer continued on the next page belongs to the SAME question / part:
+  continue it there instead of starting a new question
+"""
+
+
+_extraction_cache = None
+_rate_limiter = None
+_breaker = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Process-wide limiter: this process's share of the API rate limits.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _shared_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(
+                    REQUESTS_PER_MINUTE / EXTRACTION_PROCESSES,
+                    TOKENS_PER_MINUTE / EXTRACTION_PROCESSES
+                )
+    return _rate_limiter
+
+
+def get_breaker():
+    """
+    Process-wide circuit breaker: an outage seen by one extraction
+    pauses every other one too.
+    """
+    global _breaker
+    if _breaker is None:
+        with _shared_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker()
+    return _breaker
+
+
+def process_context():
+    """
+    multiprocessing context for every process pool / worker MarkMaster
+    starts. spawn, not fork: the parent may already hold torch or thread
+    pools (extraction, embedding), which do not survive a fork.
+    """
+    return multiprocessing.get_context("spawn")
+
+
+def get_extraction_cache():
+    global _extraction_cache
+    if _extraction_cache is None:
+        _extraction_cache = DiskCache("extraction", max_bytes=EXTRACTION_CACHE_MAX_BYTES)
+    return _extraction_cache
+
+
+def extraction_cache_key(image_bytes, preprocess=PREPROCESS_OPTIONS, prompt=EXTRACTION_PROMPT):
+    """
+    image_bytes: one page, or a list of pages sent in one request.
+    """
+    images = image_bytes if isinstance(image_bytes, list) else [image_bytes]
+    return make_key(
+        *[sha256_hex(image) for image in images],
+        provider_name(),
+        MODEL_NAME,
+        sha256_hex(prompt),
+        options_signature(preprocess)
+    )
+
+
+def _cached_extraction(cache_key, name):
+    """
+    Stored extraction for cache_key (None = caching off), or None.
+    """
+    if cache_key is None:
+        return None
+
+    cached = get_extraction_cache().get(cache_key)
+    if cached is not None:
+        metrics.incr("extraction.cache_hits")
+        print(f"💾 Cache hit for {name}")
+    else:
+        metrics.incr("extraction.cache_misses")
+    return cached
+
+
+def _store_extraction(cache_key, data):
+    if cache_key is not None and data is not None:
+        get_extraction_cache().set(cache_key, data)
+
+
+def read_image(source):
+    """
+    Raw bytes of one page. source may be:
+    - a file path
+    - bytes / bytearray / memoryview (returned as is)
+    - a file-like object; uploads expose getbuffer(), used without copying
+    Hashing and base64 both accept any of these buffers directly.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer()
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source.read()
+
+
+def source_name(source, index=None):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.basename(source)
+
+    name = getattr(source, "name", None)
+    if name:
+        return os.path.basename(name)
+
+    return f"page_{index + 1}" if index is not None else "in-memory page"
+
+
+def encode_image(source):
+    return base64.b64encode(read_image(source)).decode()
+
+
+def estimate_request_tokens(prompt=EXTRACTION_PROMPT, images=1):
+    return len(prompt) // 4 + images * (IMAGE_TOKEN_ESTIMATE + RESPONSE_TOKEN_ESTIMATE)
+
+
+def batch_prompt(page_count):
+    if page_count == 1:
+        return EXTRACTION_PROMPT
+    return EXTRACTION_PROMPT + BATCH_PROMPT_SUFFIX.format(pages=page_count)
+
+
+def merge_questions(data):
+    """
+    Fold repeated question_ids (and, inside them, repeated part_ids) into
+    the first occurrence: an answer continued on the next page becomes one
+    question / part, with contents joined and sub-topics appended.
+    """
+    questions = {}
+    merged = []
+
+    for q in data.get("questions", []):
+        qid = q.get("question_id")
+        if not qid or qid not in questions:
+            q = dict(q, parts=[dict(p) for p in q.get("parts", [])])
+            merged.append(q)
+            if qid:
+                questions[qid] = q
+            continue
+
+        target = questions[qid]
+        parts = {p.get("part_id"): p for p in target["parts"]}
+        for part in q.get("parts", []):
+            existing = parts.get(part.get("part_id"))
+            if existing is None:
+                part = dict(part)
+                target["parts"].append(part)
+                parts[part.get("part_id")] = part
+                continue
+
+            content = part.get("content", "")
+            if content:
+                existing["content"] = f"{existing.get('content', '')} {content}".strip()
+            existing["sub_topics"] = existing.get("sub_topics", []) + part.get("sub_topics", [])
+
+    return dict(data, questions=merged)
+
+
+class ExtractionError(Exception):
+    """
+    A page that still failed after its retries.
+    """
+
+    def __init__(self, name, attempts, error):
+        super().__init__(f"{name}: {error} (after {attempts} attempts)")
+        self.name = name
+        self.attempts = attempts
+        self.error = error
+
+
+def extract_content_from_image(image_path, max_retries=RETRY_MAX_ATTEMPTS,
+                               retry_delay=RETRY_BASE_DELAY,
+                               limiter=None, use_cache=True,
+                               preprocess=PREPROCESS_OPTIONS, prepared=None,
+                               policy=None, breaker=None, raise_errors=False):
+    """
+    Extract full answer sheet structure:
+    Questions -> Parts -> Topics -> Subtopics
+
+    image_path may also be an in-memory source (see read_image).
+
+    If a RateLimiter is given, every attempt waits for a request slot
+    and its estimated tokens before calling the API.
+    Results are cached on disk by image content, so re-extracting
+    a known page never touches the network.
+
+    The page is shrunk with preprocess_image(preprocess) before upload;
+    `prepared` may carry that result (or a Future of it) computed elsewhere.
+
+    Failed attempts back off per `policy` (default: RetryPolicy(max_retries,
+    retry_delay)), honouring Retry-After. A shared CircuitBreaker pauses
+    every page of the queue while the API is failing.
+    Returns None once retries are exhausted, or raises ExtractionError
+    with raise_errors=True.
+    """
+
+    image_bytes = read_image(image_path)
+    name = source_name(image_path)
+
+    cache_key = extraction_cache_key(image_bytes, preprocess) if use_cache else None
+    cached = _cached_extraction(cache_key, name)
+    if cached is not None:
+        return cached
+
+    with metrics.span("extraction.preprocess"):
+        payload = _prepared_payload(image_bytes, prepared, preprocess)
+
+    metrics.incr("extraction.bytes_original", len(image_bytes))
+    metrics.incr("extraction.bytes_sent", len(payload))
+
+    data = _request_extraction(
+        [payload], name, EXTRACTION_PROMPT,
+        limiter, policy or RetryPolicy(max_retries, retry_delay), breaker, raise_errors
+    )
+    _store_extraction(cache_key, data)
+    return data
+
+
+def extract_content_from_pages(pages, max_retries=RETRY_MAX_ATTEMPTS,
+                               retry_delay=RETRY_BASE_DELAY,
+                               limiter=None, use_cache=True,
+                               preprocess=PREPROCESS_OPTIONS, prepared=None,
+                               policy=None, breaker=None, raise_errors=False):
+    """
+    Extract several consecutive pages of ONE script in a single request.
+    Returns one merged questions tree (answers continuing over a page
+    break stay in the same question / part), or None on failure.
+
+    prepared: optional list (one per page) of pre-processed bytes / Futures.
+    Other arguments as for extract_content_from_image.
+    """
+    pages = list(pages)
+    images = [read_image(page) for page in pages]
+    name = " + ".join(source_name(page, i) for i, page in enumerate(pages))
+    prompt = batch_prompt(len(pages))
+
+    cache_key = extraction_cache_key(images, preprocess, prompt) if use_cache else None
+    cached = _cached_extraction(cache_key, name)
+    if cached is not None:
+        return cached
 
-    encoded = encode_image(image_path)
+    prepared = prepared or [None] * len(pages)
+    payloads = []
+    with metrics.span("extraction.preprocess"):
+        for image, ready in zip(images, prepared):
+            payloads.append(_prepared_payload(image, ready, preprocess))
+
+    metrics.incr("extraction.bytes_original", sum(len(i) for i in images))
+    metrics.incr("extraction.bytes_sent", sum(len(p) for p in payloads))
+
+    data = _request_extraction(
+        payloads, name, prompt,
+        limiter, policy or RetryPolicy(max_retries, retry_delay), breaker, raise_errors
+    )
+    if data is not None:
+        data = merge_questions(data)
+    _store_extraction(cache_key, data)
+    return data
+
+
+def _prepared_payload(image_bytes, prepared, preprocess):
+    """
+    Pre-processed bytes for a page: `prepared` as given, the result of its
+    Future, or computed inline (also when the pre-processing pool failed).
+    """
+    if prepared is None:
+        return preprocess_image(image_bytes, preprocess)
+    if not hasattr(prepared, "result"):
+        return prepared
+
+    try:
+        return prepared.result()
+    except Exception as e:
+        # BrokenProcessPool etc. must not cost the page its extraction
+        metrics.incr("extraction.preprocess_fallbacks")
+        print(f"⚠️ Pre-processing pool failed ({type(e).__name__}), pre-processing inline")
+        return preprocess_image(image_bytes, preprocess)
+
+
+def _request_extraction(payloads, name, prompt, limiter, policy,
+                        breaker, raise_errors):
+    """
+    One vision request (one image per payload) with retries / backoff /
+    circuit breaking. Returns the parsed JSON.
+    """
+    content = [{"type": "text", "text": prompt}] + [
+        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64.b64encode(p).decode()}"}}
+        for p in payloads
+    ]
+    started = time.monotonic()
+    attempt = 0
+
+    while True:
+        attempt += 1
+        if attempt > 1:
+            metrics.incr("extraction.retries")
+
+        if breaker:
+            with metrics.span("extraction.breaker_wait"):
+                breaker.wait()
+
+        if limiter:
+            with metrics.span("extraction.rate_limit_wait"):
+                limiter.acquire(estimate_request_tokens(prompt, len(payloads)))
 
-    for attempt in range(1, max_retries + 1):
         try:
-            res = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded}"}}
-                    ]
-                }],
-                response_format={"type": "json_object"},
-                seed=42,
-                temperature=0.0,
-                top_p=1
-            )
+            try:
+                with metrics.span("extraction.api_call"):
+                    res = complete(
+                        model=MODEL_NAME,
+                        messages=[{"role": "user", "content": content}],
+                        response_format={"type": "json_object"},
+                        seed=42,
+                        temperature=0.0,
+                        top_p=1,
+                        timeout=EXTRACTION_TIMEOUT
+                    )
+            except Exception as e:
+                # Only transient API failures count towards opening the breaker
+                if breaker:
+                    if is_retryable(e):
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                raise
+
+            if breaker:
+                breaker.record_success()
+
+            usage = getattr(res, "usage", None)
+            if usage is not None:
+                metrics.incr("llm.tokens", getattr(usage, "total_tokens", 0) or 0)
 
             data = json.loads(res.choices[0].message.content)
 
@@ -92,32 +456,301 @@ CRITICAL RULES:
                 raise ValueError("Missing questions key")
 
         except Exception as e:
-            print(f"⚠️ Attempt {attempt} failed for {os.path.basename(image_path)}: {e}")
-            if attempt < max_retries:
-                time.sleep(retry_delay)
-            else:
-                print(f"❌ Failed to extract {os.path.basename(image_path)}")
-                return None
+            print(f"⚠️ Attempt {attempt} failed for {name}: {e}")
 
+            delay = policy.delay(attempt, e)
+            server_wait = retry_after(e)
+            if breaker and server_wait:
+                # Rate limited: hold the whole queue, not just this page
+                breaker.pause(min(server_wait, policy.max_delay))
 
-def process_folder(folder_path):
+            if policy.should_retry(attempt, e, time.monotonic() - started, delay):
+                with metrics.span("extraction.backoff"):
+                    time.sleep(delay)
+                continue
+
+            print(f"❌ Failed to extract {name}")
+            if raise_errors:
+                raise ExtractionError(name, attempt, e) from e
+            return None
+
+
+def page_sort_key(path):
+    """
+    Natural order: digit runs compare as numbers, so page2 < page10.
+    Ties (page02 / page2, Page / page) fall back to the plain path.
+    """
+    parts = [
+        (0, int(part), "") if part.isdigit() else (1, 0, part.lower())
+        for part in re.split(r"(\d+)", path)
+    ]
+    return parts, path
+
+
+def list_images(folder_path):
     patterns = ["**/*.jpg", "**/*.jpeg", "**/*.png"]
     files = []
     for p in patterns:
         files.extend(glob.glob(os.path.join(folder_path, p), recursive=True))
 
-    results = []
+    # Stable page order regardless of extension / filesystem order
+    return sorted(set(files), key=page_sort_key)
+
+
+def resolve_pages(source):
+    """
+    Folder path → its images in page order; anything else is taken as an
+    already ordered iterable of page sources (paths or in-memory images).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return list_images(source)
+    return list(source)
+
+
+def find_duplicate_pages(pages, max_distance=DUPLICATE_MAX_DISTANCE):
+    """
+    Pages that are copies of an earlier page (re-photographs too when
+    max_distance is set, see page_dedup).
+    Returns {duplicate_index: (original_index, distance)} and prints
+    which pages were collapsed.
+    """
+    with metrics.span("extraction.dedupe"):
+        duplicates = find_duplicates([read_image(page) for page in pages], max_distance)
 
-    for file in files:
-        print(f"-> Processing: {os.path.basename(file)}")
-        data = extract_content_from_image(file)
+    for index, (original, distance) in sorted(duplicates.items()):
+        print(
+            f"⏭️ Skipping {source_name(pages[index], index)}: duplicate of "
+            f"{source_name(pages[original], original)} (distance {distance})"
+        )
+    metrics.incr("extraction.duplicates", len(duplicates))
+    return duplicates
 
+
+def _start_preprocessing(indexed_pages, preprocess, use_cache):
+    """
+    Submit pre-processing of every uncached page to a process pool so it
+    overlaps with network calls. Returns (pool or None, {index: Future}).
+    """
+    if not preprocess or len(indexed_pages) < 2:
+        return None, {}
+
+    todo = []
+    for i, page in indexed_pages:
+        data = read_image(page)
+        if use_cache and get_extraction_cache().contains(extraction_cache_key(data, preprocess)):
+            continue
+        todo.append((i, data))
+
+    if len(todo) < 2:
+        return None, {}
+
+    pool = ProcessPoolExecutor(
+        max_workers=min(PREPROCESS_WORKERS, len(todo)),
+        mp_context=process_context()
+    )
+    try:
+        futures = {
+            i: pool.submit(preprocess_image, bytes(data), preprocess)
+            for i, data in todo
+        }
+    except Exception:
+        # Pool unusable → every page is pre-processed inline instead
+        pool.shutdown(cancel_futures=True)
+        return None, {}
+    return pool, futures
+
+
+def plan_batches(indexed_pages, max_images=BATCH_MAX_IMAGES, max_bytes=BATCH_MAX_BYTES,
+                 payload_size=None):
+    """
+    Split [(index, page)] into runs of consecutive pages of at most
+    max_images images and max_bytes of request payload.
+    payload_size(index, page) gives a page's pre-processed size (default:
+    its raw size, an upper bound). A page larger than max_bytes on its own
+    still gets a request of its own.
+
+    Yields each batch as soon as it is closed, so callers can start on it
+    while later pages are still being pre-processed.
+    """
+    payload_size = payload_size or (lambda index, page: len(read_image(page)))
+    current, size = [], 0
+
+    for index, page in indexed_pages:
+        page_bytes = payload_size(index, page)
+        if current and (len(current) >= max_images or size + page_bytes > max_bytes):
+            yield current
+            current, size = [], 0
+        current.append((index, page))
+        size += page_bytes
+
+    if current:
+        yield current
+
+
+def iter_pages(pages, concurrency=MAX_CONCURRENCY,
+               requests_per_minute=SHARED_LIMIT,
+               tokens_per_minute=SHARED_LIMIT,
+               use_cache=True, preprocess=PREPROCESS_OPTIONS,
+               dedupe=True, policy=None, breaker=None, dead_letters=None,
+               batch_pages=BATCH_PAGES, batch_bytes=BATCH_MAX_BYTES):
+    """
+    Extract every page, yielding (page_index, page, data) as soon as each
+    page finishes (completion order, not page order).
+    data is None for pages that failed. With dedupe, byte-identical pages
+    (and near duplicates if MARKMASTER_DUPLICATE_DISTANCE is set) are
+    skipped (not yielded) - see find_duplicate_pages.
+
+    Pages are sent to the API from a bounded thread pool of `concurrency`
+    workers, throttled by the process-wide limiter (get_rate_limiter) and
+    circuit breaker (get_breaker), so concurrent calls share one budget.
+    Numeric requests_per_minute / tokens_per_minute (None = unlimited)
+    give this call its own limiter instead; `breaker` its own breaker.
+    Pre-processing runs ahead in a small process pool.
+
+    Failed pages are appended to `dead_letters` (if given) as
+    {"index", "page", "source", "attempts", "error"} for requeue().
+
+    batch_pages > 1 packs up to that many consecutive pages (and at most
+    batch_bytes of pre-processed images) into one request (extract_content_from_pages);
+    each batch is yielded once, under its first page's index. Extracted
+    data carries "page_indices": every page index it covers.
+    """
+    pages = list(pages)
+    if not pages:
+        return
+
+    duplicates = find_duplicate_pages(pages) if dedupe and len(pages) > 1 else {}
+    indexed_pages = [(i, page) for i, page in enumerate(pages) if i not in duplicates]
+
+    if requests_per_minute == SHARED_LIMIT and tokens_per_minute == SHARED_LIMIT:
+        limiter = get_rate_limiter()
+    else:
+        limiter = RateLimiter(
+            REQUESTS_PER_MINUTE if requests_per_minute == SHARED_LIMIT else requests_per_minute,
+            TOKENS_PER_MINUTE if tokens_per_minute == SHARED_LIMIT else tokens_per_minute
+        )
+    breaker = breaker or get_breaker()
+    batching = bool(batch_pages and batch_pages > 1)
+    # Batches are budgeted on pre-processed sizes and cached per batch,
+    # so every page is pre-processed (not only pages uncached on their own)
+    prep_pool, prepared = _start_preprocessing(
+        indexed_pages, preprocess, use_cache and not batching
+    )
+
+    def payload_size(index, page):
+        payload = _prepared_payload(read_image(page), prepared.get(index), preprocess)
+        prepared[index] = payload
+        return len(payload)
+
+    def extract(batch):
+        index, page = batch[0]
+        names = [source_name(p, i) for i, p in batch]
+        print(f"-> Processing: {' + '.join(names)}")
+        with metrics.span("extraction.page"):
+            try:
+                if len(batch) == 1:
+                    data = extract_content_from_image(
+                        page, limiter=limiter, use_cache=use_cache,
+                        preprocess=preprocess, prepared=prepared.get(index),
+                        policy=policy, breaker=breaker, raise_errors=True
+                    )
+                else:
+                    data = extract_content_from_pages(
+                        [p for _, p in batch], limiter=limiter, use_cache=use_cache,
+                        preprocess=preprocess, prepared=[prepared.get(i) for i, _ in batch],
+                        policy=policy, breaker=breaker, raise_errors=True
+                    )
+            except ExtractionError as e:
+                data = None
+                if dead_letters is not None:
+                    dead_letters.extend({
+                        "index": i,
+                        "page": p,
+                        "source": source_name(p, i),
+                        "attempts": e.attempts,
+                        "error": str(e.error),
+                    } for i, p in batch)
+
+        metrics.incr("extraction.pages", len(batch))
+        metrics.incr("extraction.requests")
+        if data:
+            data["source"] = ", ".join(names)
+            data["page_indices"] = [i for i, _ in batch]
+        else:
+            metrics.incr("extraction.failed_pages", len(batch))
+        return data
+
+    if batching:
+        batches = plan_batches(
+            indexed_pages, min(batch_pages, BATCH_MAX_IMAGES), batch_bytes, payload_size
+        )
+    else:
+        batches = [[item] for item in indexed_pages]
+
+    workers = max(1, min(int(concurrency), len(indexed_pages)))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(extract, batch): batch[0] for batch in batches}
+
+            for future in as_completed(futures):
+                index, page = futures[future]
+                yield index, page, future.result()
+    finally:
+        if prep_pool:
+            prep_pool.shutdown(cancel_futures=True)
+
+
+def requeue(dead_letters, **kwargs):
+    """
+    Retry only the pages in dead_letters, yielding (page_index, page, data)
+    with their original indices. dead_letters is updated in place to the
+    pages that failed again.
+    """
+    retry = list(dead_letters)
+    dead_letters.clear()
+    if not retry:
+        return
+
+    failed = []
+    kwargs["dedupe"] = False
+    for i, page, data in iter_pages([d["page"] for d in retry], dead_letters=failed, **kwargs):
+        if data:
+            data["page_indices"] = [retry[j]["index"] for j in data["page_indices"]]
+        yield retry[i]["index"], page, data
+
+    for letter in failed:
+        letter["index"] = retry[letter["index"]]["index"]
+        dead_letters.append(letter)
+
+
+def iter_folder(folder_path, **kwargs):
+    """
+    iter_pages over a folder's images, or over in-memory page sources.
+    """
+    return iter_pages(resolve_pages(folder_path), **kwargs)
+
+
+def process_pages(pages, **kwargs):
+    """
+    Extract every page (see iter_pages).
+    Results are returned in page order.
+    """
+    extracted = sorted(iter_pages(pages, **kwargs), key=lambda page: page[0])
+
+    results = []
+
+    for index, page, data in extracted:
         if data:
-            data["source"] = os.path.basename(file)
             results.append(data)
         else:
-            print(f"⚠️ Skipped {os.path.basename(file)}")
+            print(f"⚠️ Skipped {source_name(page, index)}")
+
+    return results
 
-        time.sleep(1.2)
 
-    return results
\ No newline at end of file
+def process_folder(folder_path, **kwargs):
+    """
+    Extract every image in the folder, in page (file name) order.
+    folder_path may also be a list of in-memory page sources.
+    """
+    return process_pages(resolve_pages(folder_path), **kwargs)
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import shutil
 import tempfile
@@ -31,6 +32,18 @@ def prepare_upload_folder(uploaded_files, prefix="uploaded_"):
     return temp_folder
 
 
+def uploads_hash(uploaded_files):
+    """
+    Content hash of a set of uploads (name + bytes, in name order).
+    Same files → same hash, whatever temp folder they end up in.
+    """
+    h = hashlib.sha256()
+    for file in sorted(uploaded_files, key=lambda f: f.name):
+        h.update(file.name.encode())
+        h.update(hashlib.sha256(file.getbuffer()).digest())
+    return h.hexdigest()
+
+
 def clear_temp_folder(folder_path):
     if folder_path and os.path.exists(folder_path):
         shutil.rmtree(folder_path)
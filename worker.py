@@ -0,0 +1,198 @@
+import argparse
+import os
+import socket
+import threading
+import time
+
+import embedder
+import metrics
+import text_extracr
+from job_queue import STAGES, JobQueue
+from pipeline import score_student, stream_student
+from scheme import load_or_compile
+from text_extracr import find_duplicate_pages, resolve_pages, source_name
+
+
+POLL_INTERVAL = 1.0
+HEARTBEAT_INTERVAL = 10.0
+
+
+def _reached(job, stage):
+    return STAGES.index(job["stage"]) >= STAGES.index(stage)
+
+
+def duplicate_labels(pages, duplicates):
+    """
+    "page (= earlier page)" labels for pages skipped as duplicates.
+    """
+    return [
+        f"{source_name(pages[i], i)} (= {source_name(pages[original], original)})"
+        for i, (original, _) in sorted(duplicates.items())
+    ]
+
+
+def run_job(queue, job):
+    """
+    scheme → extract (page by page) → score, skipping what a previous
+    attempt already finished: the scheme artifact is on disk and every
+    extracted page is stored as a job artifact.
+    """
+    job_id = job["id"]
+    params = job["params"]
+    total_marks = params["total_marks"]
+
+    metrics.reset()
+
+    # ---------- SCHEME ----------
+    model_pages = resolve_pages(params["model_source"])
+    model_duplicates = find_duplicate_pages(model_pages) if len(model_pages) > 1 else {}
+
+    with metrics.span("job.scheme"):
+        scheme = load_or_compile(params["model_source"], total_marks)
+    if not scheme["model_by_q"]:
+        raise ValueError("No questions extracted from the model answer")
+    if not _reached(job, "scheme"):
+        queue.set_stage(job_id, "scheme")
+
+    # ---------- EXTRACT ----------
+    # page:<index> artifacts hold each extracted page; the other pages of a
+    # multi-page request are stored as null (covered by the first one)
+    pages = resolve_pages(params["student_source"])
+    done = {
+        int(name.split(":", 1)[1]): data
+        for name, data in queue.artifacts(job_id, "page:").items()
+    }
+    duplicates = find_duplicate_pages(pages) if len(pages) > 1 else {}
+    remaining = [
+        (i, page) for i, page in enumerate(pages)
+        if i not in done and i not in duplicates
+    ]
+    dead_letters = []
+    queue.set_progress(job_id, len(done) + len(duplicates), len(pages))
+
+    if remaining:
+        def on_page(position, data):
+            # Failed pages are not stored → a resumed job tries them again
+            if data:
+                covered = [remaining[p][0] for p in data["page_indices"]]
+                data["page_indices"] = covered
+                for index in covered:
+                    done[index] = data if index == covered[0] else None
+                    queue.save_artifact(job_id, f"page:{index}", done[index])
+
+            queue.set_progress(
+                job_id, len(done) + len(duplicates) + len(dead_letters), len(pages)
+            )
+
+        with metrics.span("job.extract"):
+            stream_student(
+                [page for _, page in remaining], total_marks,
+                on_page=on_page, dead_letters=dead_letters
+            )
+
+    queue.set_progress(job_id, len(pages), len(pages))
+    student_answer = [done[i] for i in sorted(done) if done[i]]
+    if not student_answer:
+        raise ValueError("No student pages extracted")
+    queue.set_stage(job_id, "extract")
+
+    # ---------- SCORE ----------
+    with metrics.span("job.score"):
+        result = score_student(scheme, student_answer, total_marks, params["assignment"])
+
+    # Same shape as batch_grade: names of pages that could not be extracted
+    failed_pages = [
+        source_name(page, i) for i, page in enumerate(pages)
+        if i not in done and i not in duplicates
+    ]
+    if failed_pages:
+        result["failed_pages"] = failed_pages
+    # Spooled uploads are pruned later → the app must not need the pages
+    result["duplicate_pages"] = {
+        "Model": duplicate_labels(model_pages, model_duplicates),
+        "Student": duplicate_labels(pages, duplicates),
+    }
+    result["metrics"] = metrics.snapshot()
+    queue.complete(job_id, result)
+    return result
+
+
+def worker_loop(worker_id=None, once=False, poll_interval=POLL_INTERVAL):
+    """
+    Claim and run jobs until stopped (or, with once, until the queue is empty).
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = JobQueue()
+    current = {"job": None}
+    stop = threading.Event()
+
+    # Heartbeats keep long extractions from looking abandoned. The first
+    # goes out before the model load so the app sees this worker at once
+    queue.heartbeat(worker_id=worker_id)
+
+    def beat():
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            queue.heartbeat(current["job"], worker_id)
+
+    threading.Thread(target=beat, daemon=True).start()
+
+    metrics.enable()
+    embedder.warmup()
+    print(f"👷 Worker {worker_id} ready")
+
+    try:
+        while True:
+            job = queue.claim(worker_id)
+            if job is None:
+                if once:
+                    return
+                queue.heartbeat(worker_id=worker_id)
+                time.sleep(poll_interval)
+                continue
+
+            current["job"] = job["id"]
+            resumed = f" (resuming after '{job['stage']}')" if job["stage"] != "queued" else ""
+            print(f"\n===== Job {job['id']}{resumed} =====")
+
+            try:
+                result = run_job(queue, job)
+                print(f"✅ Job {job['id']}: {round(result['total_score'], 2)}")
+                queue.prune_uploads()
+            except Exception as e:
+                print(f"❌ Job {job['id']} failed: {e}")
+                queue.fail(job["id"], e)
+            finally:
+                current["job"] = None
+    finally:
+        stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run grading jobs from the job queue")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        worker_loop(once=args.once)
+        return
+
+    # The workers share the API key → each throttles to its share of the
+    # rate limits (spawned children read this at import)
+    os.environ["MARKMASTER_EXTRACTION_PROCESSES"] = str(
+        args.workers * text_extracr.EXTRACTION_PROCESSES
+    )
+
+    ctx = text_extracr.process_context()
+    processes = [
+        ctx.Process(target=worker_loop, kwargs={"once": args.once})
+        for _ in range(args.workers)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()